@@ -1,29 +1,61 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, ORJSONResponse
 from pydantic import BaseModel
-import shutil
+from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 import os
-import uuid
-import ollama
+import json
+import asyncio
+from functools import partial
 from typing import Optional, Union, List
 from datetime import datetime
 
 # --- SERVICE IMPORTS ---
 from app.services.hearing import hearing_service
-from app.services.brain import brain_service
+from app.services.brain import brain_service, EXPLAIN_PROMPT_VERSION
 from app.services.pharmacist import pharmacist_service
-from app.services.registry import registry_service, Consultation 
+from app.services.registry import registry_service, get_db, get_read_db, PATIENT_FIELDS
+from app.services.database import pool_stats
 from app.services.report import report_service
-from app.services.vision import vision_service
-from app.services.knowledge import knowledge_service 
-from langchain_community.document_loaders import PyPDFLoader
+from app.services.knowledge import knowledge_service, LIBRARY_DIR
 from app.services.house import house_service
 from app.services.omni import omni_service
 from app.services.lab import lab_service
 from app.services.passport import passport_service
-
-app = FastAPI(title="Vitalis API", version="1.0.0")
+from app.services.pipeline import consultation_pipeline
+from app.services.jobs import job_manager
+from app.services.scheduler import model_scheduler, PRIORITIES
+from app.services.uploads import UploadScratch, upload_scratch, extract_pdf_text
+from app.services.container import container
+from app.services.dictation import DictationSession
+from app.services.llm import llm_gateway
+from app.services.residency import residency_manager
+from app.services.prefetch import prefetcher
+from app.services.structured import PatientExtract
+
+# Load models in the background at startup (set VITALIS_WARMUP=0 to load on first use only)
+WARMUP = os.getenv("VITALIS_WARMUP", "1") == "1"
+# Sync the index with library/ at startup (background job; unchanged files are skipped)
+BOOTSTRAP_LIBRARY = os.getenv("VITALIS_BOOTSTRAP_LIBRARY", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_manager.start()
+    if WARMUP:
+        container.warmup()  # Returns immediately; /health/ready flips once models are hot
+    residency_manager.start(llm_gateway.client)  # Preloads llava + llama3.2, tracks load/unload
+    if BOOTSTRAP_LIBRARY:
+        submit_ingest("knowledge_sync", knowledge_service.sync_library)
+    yield
+    # Stop the job workers, then release the agent worker threads
+    residency_manager.stop()
+    await job_manager.stop()
+    consultation_pipeline.shutdown()
+    hearing_service.shutdown()
+    knowledge_service.shutdown()
+
+app = FastAPI(title="Vitalis API", version="1.0.0", lifespan=lifespan)
 
 # --- CORS SETUP ---
 app.add_middleware(
@@ -32,11 +64,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# --- MODEL RESIDENCY: reload whatever this endpoint needs if Ollama has dropped it ---
+@app.middleware("http")
+async def keep_models_resident(request, call_next):
+    residency_manager.prepare(request.url.path)
+    return await call_next(request)
+
 UPLOAD_DIR = "temp_uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Lists are paged (?limit=&cursor=); the next cursor travels in a header so bodies keep their shape
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE = 50   # Rows per page unless the client asks for more (follow X-Next-Cursor for the rest)
+MAX_PAGE = 500
+
+def paged(content, next_cursor) -> ORJSONResponse:
+    headers = {NEXT_CURSOR_HEADER: str(next_cursor)} if next_cursor is not None else None
+    return ORJSONResponse(content, headers=headers)
+
 # --- DATA MODELS ---
 class PatientCreate(BaseModel):
     name: str
@@ -49,15 +97,38 @@ class PatientCreate(BaseModel):
 def read_root():
     return {"status": "Vitalis System Online"}
 
+# 0. HEALTH PROBES
+@app.get("/health/live")
+def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def health_ready():
+    # Without warmup the models load on first use, so there is nothing to wait for
+    status = {"ready": container.ready() if WARMUP else True, "warmup": WARMUP, "services": container.status()}
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 # 1. GET ALL PATIENTS
-@app.get("/patients/")
-def get_patients():
-    return registry_service.get_all_patients()
+@app.get("/patients/", response_class=ORJSONResponse)
+def get_patients(
+    limit: int = Query(DEFAULT_PAGE, ge=1, le=MAX_PAGE),
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None, # e.g. "id,name" (default: every column)
+    db: Session = Depends(get_read_db)
+):
+    selected = PATIENT_FIELDS
+    if fields:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = set(selected) - set(PATIENT_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}. Use: {', '.join(PATIENT_FIELDS)}")
+    rows, next_cursor = registry_service.list_patients(db, selected, limit, cursor)
+    return paged([row._asdict() for row in rows], next_cursor)
 
 # 2. CREATE NEW PATIENT
 @app.post("/patients/")
-def create_patient(patient: PatientCreate):
-    new_p = registry_service.create_patient(patient.name, patient.age, patient.medical_history)
+def create_patient(patient: PatientCreate, db: Session = Depends(get_db)):
+    new_p = registry_service.create_patient(patient.name, patient.age, patient.medical_history, db)
     return {"id": new_p.id, "name": new_p.name, "status": "Registered"}
 
 # 3. PROCESS CONSULTATION
@@ -66,7 +137,9 @@ async def process_consultation(
     file: UploadFile = File(...),
     image: Optional[UploadFile] = File(None),
     patient_id: int = Form(...),
-    use_rag: bool = Form(True)
+    use_rag: bool = Form(True),
+    beam_size: Optional[int] = Form(None), # 1 = fastest, 5 = most accurate (default)
+    scratch: UploadScratch = Depends(upload_scratch)
 ):
     patient = registry_service.get_patient(patient_id)
     if not patient:
@@ -74,70 +147,235 @@ async def process_consultation(
     
     patient_context = f"Patient: {patient.name} (Age: {patient.age}). History: {patient.medical_history}"
 
-    file_id = str(uuid.uuid4())
-    audio_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file.filename}")
-    with open(audio_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    visual_findings = "No image provided."
-    if image:
-        image_path = os.path.join(UPLOAD_DIR, f"{file_id}_{image.filename}")
-        with open(image_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        visual_findings = vision_service.analyze_image(image_path)
-        os.remove(image_path)
+    # Buffers go straight to Whisper / LLaVA (no temp_uploads round-trip)
+    audio = await scratch.read(file, "audio")
+    image_bytes = (await scratch.read(image, "image")).read_bytes() if image else None
 
     try:
-        transcript = hearing_service.transcribe_audio(audio_path)
-        combined_input = f"AUDIO TRANSCRIPT: {transcript}\n\nVISUAL FINDINGS FROM IMAGE: {visual_findings}"
-        soap_note = brain_service.generate_soap_note(combined_input, use_rag=use_rag)
-        safety_check = pharmacist_service.check_safety(soap_note, patient_context)
-        registry_service.save_consultation(patient_id, soap_note, safety_check)
-        os.remove(audio_path)
-        
-        return {
-            "transcript": transcript,
-            "visual_analysis": visual_findings,
-            "soap_note": soap_note,
-            "safety_analysis": safety_check,
-            "patient_context": patient_context
-        }
+        # Vision + Hearing run in parallel, Brain + Pharmacist after (all off the event loop)
+        result = await consultation_pipeline.run(audio.stream(), image_bytes, patient_context, use_rag=use_rag, beam_size=beam_size, audio_hash=audio.sha256, patient_name=patient.name)
+        registry_service.save_consultation(patient_id, result["soap_note"], result["safety_analysis"])
+        return {**result, "patient_context": patient_context}
     except Exception as e:
         return {"error": str(e)}
 
+# 3b. STREAM CONSULTATION (Server-Sent Events)
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/consultation/stream/")
+async def stream_consultation(
+    file: UploadFile = File(...),
+    image: Optional[UploadFile] = File(None),
+    patient_id: int = Form(...),
+    use_rag: bool = Form(True),
+    beam_size: Optional[int] = Form(None)
+):
+    patient = registry_service.get_patient(patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    patient_context = f"Patient: {patient.name} (Age: {patient.age}). History: {patient.medical_history}"
+
+    # The stream outlives the request body, so keep our own copy of the buffers
+    scratch = UploadScratch()
+    try:
+        audio = await scratch.read(file, "audio", own=True)
+        image_bytes = (await scratch.read(image, "image")).read_bytes() if image else None
+    except Exception:
+        scratch.close()
+        raise
+
+    async def events():
+        result = {}
+        try:
+            async for event, data in consultation_pipeline.stream(audio.stream(), image_bytes, patient_context, use_rag=use_rag, beam_size=beam_size, audio_hash=audio.sha256, patient_name=patient.name):
+                if event in ("soap_note", "safety_analysis"):
+                    result[event] = data["text"]
+                yield sse_event(event, data)
+            registry_service.save_consultation(patient_id, result["soap_note"], result["safety_analysis"])
+            yield sse_event("done", {"patient_context": patient_context})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            scratch.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# 3c. CONSULTATION JOBS (Queue + Poll/Subscribe)
+@app.post("/jobs/consultation/")
+async def submit_consultation_job(
+    file: UploadFile = File(...),
+    image: Optional[UploadFile] = File(None),
+    patient_id: int = Form(...),
+    use_rag: bool = Form(True),
+    priority: str = Form("routine"), # ed | urgent | routine | batch
+    beam_size: Optional[int] = Form(None)
+):
+    if priority.lower() not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority. Use one of: {', '.join(PRIORITIES)}")
+    patient = registry_service.get_patient(patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    patient_context = f"Patient: {patient.name} (Age: {patient.age}). History: {patient.medical_history}"
+
+    # The job runs after this request returns, so it owns its buffers (released when it ends)
+    scratch = UploadScratch()
+    try:
+        audio = await scratch.read(file, "audio", own=True)
+        image_bytes = (await scratch.read(image, "image")).read_bytes() if image else None
+    except Exception:
+        scratch.close()
+        raise
+
+    async def run(job):
+        try:
+            result = await consultation_pipeline.run(audio.stream(), image_bytes, patient_context, use_rag=use_rag, beam_size=beam_size, audio_hash=audio.sha256, patient_name=patient.name)
+            registry_service.save_consultation(patient_id, result["soap_note"], result["safety_analysis"])
+            return {**result, "patient_context": patient_context}
+        finally:
+            scratch.close()
+
+    job = job_manager.submit("consultation", run, priority=priority, patient_id=patient_id)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs/")
+def list_jobs():
+    return {"jobs": job_manager.stats(), "models": model_scheduler.stats()}
+
+# 3d. METRICS
+@app.get("/metrics/")
+def get_metrics():
+    return {
+        "whisper": hearing_service.metrics(),
+        "llm": llm_gateway.stats(),
+        "models": model_scheduler.stats(),
+        "residency": residency_manager.stats(),
+        "pharmacist": pharmacist_service.stats(),
+        "prefetch": prefetcher.stats(),
+        "knowledge": knowledge_service.stats(),
+        "jobs": job_manager.stats(),
+        "database": pool_stats(),
+    }
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def follow_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for e in job_manager.follow(job):
+            yield sse_event(e["event"], {**e["data"], "timestamp": e["timestamp"]})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# 3e. LIVE DICTATION (WebSocket)
+# Client sends binary audio frames (pcm16 mono, or raw Opus packets with ?encoding=opus),
+# then the text message "stop". Server sends partial/final segments while audio flows,
+# and the transcript, SOAP note and safety check once the session ends.
+@app.websocket("/dictation/ws")
+async def live_dictation(
+    websocket: WebSocket,
+    patient_id: Optional[int] = None,
+    encoding: str = "pcm16",
+    sample_rate: int = 16000,
+    use_rag: bool = True
+):
+    await websocket.accept()
+    residency_manager.prepare("/dictation/ws")  # Llama writes the note once dictation stops
+    try:
+        session = DictationSession(encoding, sample_rate)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close()
+        return
+
+    patient = registry_service.get_patient(patient_id) if patient_id else None
+    if patient_id and not patient:
+        # Don't dictate into the void: the note could never be saved
+        await websocket.send_json({"type": "error", "error": f"Patient {patient_id} not found"})
+        await websocket.close()
+        return
+    patient_context = f"Patient: {patient.name} (Age: {patient.age}). History: {patient.medical_history}" if patient else "No patient selected."
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                try:
+                    session.feed(message["bytes"])
+                except ValueError as e:
+                    # Malformed frame (odd-length pcm16, corrupt Opus packet): drop it, keep the session
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    continue
+                if session.ready():
+                    for event in await consultation_pipeline.run_stage("hearing", session.step):
+                        await websocket.send_json(event)
+            elif (message.get("text") or "").strip().lower() == "stop":
+                break
+
+        # Flush whatever is left, then hand the transcript to the Brain
+        for event in await consultation_pipeline.run_stage("hearing", session.step, True):
+            await websocket.send_json(event)
+        transcript = session.transcript
+        await websocket.send_json({"type": "transcript", "text": transcript})
+
+        if transcript:
+            result = await consultation_pipeline.analyze(transcript, patient_context, use_rag=use_rag, patient_name=patient.name if patient else None)
+            if patient:
+                registry_service.save_consultation(patient.id, result["soap_note"], result["safety_analysis"])
+            await websocket.send_json({"type": "soap_note", "text": result["soap_note"]})
+            await websocket.send_json({"type": "safety_analysis", "text": result["safety_analysis"]})
+
+        await websocket.send_json({"type": "done"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 # 4. GENERATE PDF REPORT
 @app.post("/generate-report/")
 async def generate_report_endpoint(
     patient_id: int = Form(...),
     soap_note: str = Form(...),
-    safety_analysis: str = Form(...)
+    safety_analysis: str = Form(...),
+    db: Session = Depends(get_read_db)
 ):
-    patient = registry_service.get_patient(patient_id)
+    patient = registry_service.get_patient(patient_id, db)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     pdf_path = report_service.generate_report(patient.name, patient.age, soap_note, safety_analysis)
     return FileResponse(pdf_path, media_type='application/pdf', filename=f"Medical_Report_{patient.name}.pdf")
 
 # 5. GET PATIENT HISTORY
-@app.get("/patients/{patient_id}/history")
-def get_patient_history(patient_id: int):
-    patient = registry_service.get_patient(patient_id)
+@app.get("/patients/{patient_id}/history", response_class=ORJSONResponse)
+def get_patient_history(
+    patient_id: int,
+    notes: bool = False, # Default: summaries (id, timestamp, preview); True adds the note bodies
+    limit: int = Query(DEFAULT_PAGE, ge=1, le=MAX_PAGE),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    patient = registry_service.get_patient_summary(patient_id, db)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    history = []
-    for consult in patient.consultations:
-        history.append({
-            "id": consult.id,
-            "timestamp": consult.timestamp,
-            "soap_note": consult.soap_note,
-            "safety_analysis": consult.safety_analysis
-        })
-    history.reverse()
-    return {
+    # Newest first
+    rows, next_cursor = registry_service.list_consultations(patient_id, db, notes, limit, cursor)
+    return paged({
         "patient": {"name": patient.name, "age": patient.age, "history": patient.medical_history},
-        "consultations": history
-    }
+        "consultations": [row._asdict() for row in rows]
+    }, next_cursor)
 
 # 6. TEXT-ONLY ANALYSIS
 @app.post("/analyze-text/")
@@ -151,16 +389,14 @@ async def analyze_text(
         raise HTTPException(status_code=404, detail="Patient not found")
     
     patient_context = f"Patient: {patient.name} (Age: {patient.age}). History: {patient.medical_history}"
-    soap_note = brain_service.generate_soap_note(text, use_rag=use_rag)
-    safety_check = pharmacist_service.check_safety(soap_note, patient_context)
-    registry_service.save_consultation(patient_id, soap_note, safety_check)
-    return {"soap_note": soap_note, "safety_analysis": safety_check}
+    result = await consultation_pipeline.analyze(text, patient_context, use_rag=use_rag, patient_name=patient.name)
+    registry_service.save_consultation(patient_id, result["soap_note"], result["safety_analysis"])
+    return result
 
 # 7. DOWNLOAD HISTORY PDF 
 @app.get("/consultations/{consultation_id}/download")
-def download_consultation_pdf(consultation_id: int):
-    db = registry_service.db
-    consult = db.query(Consultation).filter(Consultation.id == consultation_id).first()
+def download_consultation_pdf(consultation_id: int, db: Session = Depends(get_read_db)):
+    consult = registry_service.get_consultation(consultation_id, db)
     if not consult:
         raise HTTPException(status_code=404, detail="Consultation not found")
     pdf_path = report_service.generate_report(
@@ -169,78 +405,106 @@ def download_consultation_pdf(consultation_id: int):
     return FileResponse(pdf_path, media_type='application/pdf', filename=f"Record_{consult.patient.name}_{consult.id}.pdf")
 
 # 8. KNOWLEDGE BASE MANAGEMENT
+def submit_ingest(kind: str, ingest, *args, priority="batch", **meta):
+    """Runs a blocking ingest(…, on_progress) as a job; progress lands on the job and its event stream."""
+    async def run(job):
+        loop = asyncio.get_running_loop()
+
+        def on_progress(progress):
+            def update():
+                job.progress = progress
+                job.publish("progress", progress)
+            loop.call_soon_threadsafe(update)
+
+        return await loop.run_in_executor(None, partial(ingest, *args, on_progress=on_progress))
+
+    return job_manager.submit(kind, run, priority=priority, **meta)
+
 @app.post("/knowledge/upload/")
-async def upload_knowledge(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    try:
-        chunks = knowledge_service.ingest_pdf(file_path)
-        library_dir = "library"
-        os.makedirs(library_dir, exist_ok=True)
-        shutil.move(file_path, os.path.join(library_dir, file.filename))
-        return {"status": "success", "chunks_indexed": chunks, "filename": file.filename}
-    except Exception as e:
-        return {"error": str(e)}
+async def upload_knowledge(
+    file: Optional[UploadFile] = File(None),
+    files: List[UploadFile] = File([]),
+    priority: str = Form("batch"),
+    scratch: UploadScratch = Depends(upload_scratch)
+):
+    uploads = ([file] if file else []) + list(files)
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No PDF uploaded")
+    os.makedirs(LIBRARY_DIR, exist_ok=True)
+
+    # Files go straight into the library (their one and only write); indexing runs as a background job
+    paths = []
+    for upload in uploads:
+        pdf = await scratch.read(upload, "pdf")
+        paths.append(pdf.save_to(os.path.join(LIBRARY_DIR, os.path.basename(pdf.filename))))
+
+    filenames = [os.path.basename(p) for p in paths]
+    job = submit_ingest("knowledge_ingest", knowledge_service.ingest_pdfs, paths, priority=priority, filenames=filenames)
+    return {"status": "queued", "job_id": job.id, "filenames": filenames}
 
 # 9. LIST KNOWLEDGE
 @app.get("/knowledge/list/")
-def list_knowledge():
-    library_dir = "library"
-    if not os.path.exists(library_dir): return []
-    return [f for f in os.listdir(library_dir) if f.endswith('.pdf')]
+def list_knowledge(details: bool = False):
+    if not os.path.exists(LIBRARY_DIR): return []
+    files = [f for f in os.listdir(LIBRARY_DIR) if f.endswith('.pdf')]
+    if not details:
+        return files
+    # Catalog view: chunk/page counts and ingest timings (status "pending" = not indexed yet)
+    catalog = {d["filename"]: d for d in knowledge_service.documents()}
+    return [
+        {**catalog[f], "status": "indexed"} if f in catalog else {"filename": f, "status": "pending"}
+        for f in files
+    ]
 
 # 10. DELETE KNOWLEDGE
 @app.delete("/knowledge/{filename}")
 def delete_knowledge(filename: str):
-    library_dir = "library"
-    file_path = os.path.join(library_dir, filename)
+    filename = os.path.basename(filename)
+    file_path = os.path.join(LIBRARY_DIR, filename)
+    indexed = knowledge_service.catalog.document(filename) is not None
+    if not os.path.exists(file_path) and not indexed:
+        raise HTTPException(status_code=404, detail="File not found")
+    # Vectors first: a file left behind is re-synced on the next start, orphaned vectors are not
+    chunks_removed = knowledge_service.remove_document(filename)
     if os.path.exists(file_path):
         os.remove(file_path)
-        return {"status": "deleted"}
-    raise HTTPException(status_code=404, detail="File not found")
+    return {"status": "deleted", "chunks_removed": chunks_removed}
 
 # 11. PATIENT EXPLANATION
 @app.post("/explain/")
 async def explain_to_patient(soap_note: str = Form(...), patient_name: str = Form(...)):
-    prompt = f"""You are a compassionate medical assistant speaking directly to {patient_name}. INPUT: "{soap_note}". TASK: Summarize the Plan for the patient in simple, warm language."""
-    response = ollama.chat(model="llama3.2", messages=[{'role': 'user', 'content': prompt}])
-    return {"explanation": response['message']['content']}
+    # Prefetch mode: already written (or being written) when the note came out
+    explanation = await prefetcher.attach("explain", soap_note, patient_name)
+    if explanation is None:
+        messages = brain_service.explain_messages(soap_note, patient_name)
+        response = await llm_gateway.achat(model=brain_service.model, messages=messages, cache_version=EXPLAIN_PROMPT_VERSION)
+        explanation = response['message']['content']
+    return {"explanation": explanation}
 
 # 12. SECOND OPINION
 @app.post("/second-opinion/")
 async def get_second_opinion(soap_note: str = Form(...)):
-    ddx = house_service.get_second_opinion(soap_note)
+    ddx = await prefetcher.attach("ddx", soap_note)
+    if ddx is None:
+        ddx = await consultation_pipeline.run_stage("brain", house_service.get_second_opinion, soap_note)
     return {"ddx": ddx}
 
 # 13. EXTRACT PATIENT PDF
 @app.post("/patients/extract-from-pdf/")
-async def extract_patient_from_pdf(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, f"temp_patient_{uuid.uuid4()}.pdf")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def extract_patient_from_pdf(file: UploadFile = File(...), scratch: UploadScratch = Depends(upload_scratch)):
+    pdf = await scratch.read(file, "pdf")
     try:
-        loader = PyPDFLoader(file_path)
-        pages = loader.load()
-        text_content = "\n".join([p.page_content for p in pages])
+        text_content = extract_pdf_text(pdf.stream())
         prompt = f"""Extract patient details from this text into JSON. TEXT: "{text_content[:2000]}". OUTPUT FORMAT: {{"name": "Full Name", "age": 0, "medical_history": "Summary"}}"""
-        response = ollama.chat(model="llama3.2", messages=[{'role': 'system', 'content': 'You are a JSON extractor.'}, {'role': 'user', 'content': prompt}])
-        os.remove(file_path)
-        import json
-        clean_json = response['message']['content'].replace("```json", "").replace("```", "").strip()
-        return json.loads(clean_json)
+        extracted = await llm_gateway.achat_json("llama3.2", [{'role': 'system', 'content': 'You are a JSON extractor.'}, {'role': 'user', 'content': prompt}], PatientExtract)
+        return extracted.model_dump()
     except Exception as e:
-        if os.path.exists(file_path): os.remove(file_path)
         return {"error": str(e)}
 
 # 14. DELETE RECORD
 @app.delete("/consultations/{consultation_id}")
-def delete_consultation(consultation_id: int):
-    db = registry_service.db
-    record = db.query(Consultation).filter(Consultation.id == consultation_id).first()
-    if record:
-        db.delete(record)
-        db.commit()
+def delete_consultation(consultation_id: int, db: Session = Depends(get_db)):
+    if registry_service.delete_consultation(consultation_id, db):
         return {"status": "deleted"}
     raise HTTPException(status_code=404, detail="Record not found")
 
@@ -255,13 +519,33 @@ async def omni_chat(
 
 # 16. LAB EXTRACT
 @app.post("/labs/extract/")
-async def extract_lab_report(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, f"temp_lab_{uuid.uuid4()}.pdf")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    data = lab_service.extract_from_pdf(file_path)
-    os.remove(file_path)
-    return data
+async def extract_lab_report(file: UploadFile = File(...), scratch: UploadScratch = Depends(upload_scratch)):
+    pdf = await scratch.read(file, "pdf")
+    return lab_service.extract_from_pdf(pdf.stream())
+
+@app.post("/labs/extract/stream/")
+async def stream_lab_report(file: UploadFile = File(...)):
+    """SSE: one "row" event per lab result as soon as it is extracted, then "done"."""
+    scratch = UploadScratch()
+    try:
+        pdf = await scratch.read(file, "pdf", own=True)
+    except Exception:
+        scratch.close()
+        raise
+
+    async def events():
+        rows = []
+        try:
+            async for row in consultation_pipeline.iterate_stage("brain", lab_service.stream_from_pdf, pdf.stream()):
+                rows.append(row)
+                yield sse_event("row", row)
+            yield sse_event("done", {"results": rows})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            scratch.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 # 17. SAVE LABS (UPDATED: Dr. House Trigger)
 class LabEntry(BaseModel):
@@ -293,16 +577,16 @@ def save_lab_results(req: LabSaveRequest):
 
 # 18. GET LABS
 @app.get("/patients/{patient_id}/labs")
-def get_patient_labs(patient_id: int):
-    results = registry_service.get_patient_labs(patient_id)
+def get_patient_labs(patient_id: int, db: Session = Depends(get_read_db)):
+    results = registry_service.get_patient_labs(patient_id, db)
     return results
 
 # 19. GENERATE LAB PDF
 @app.post("/labs/generate-report/")
-def generate_lab_pdf(patient_id: int = Form(...)):
-    patient = registry_service.get_patient(patient_id)
+def generate_lab_pdf(patient_id: int = Form(...), db: Session = Depends(get_read_db)):
+    patient = registry_service.get_patient(patient_id, db)
     if not patient: raise HTTPException(status_code=404, detail="Patient not found")
-    history = registry_service.get_patient_labs(patient_id)
+    history = registry_service.get_patient_labs(patient_id, db)
     pdf_path = report_service.generate_lab_report(patient.name, patient.age, history)
     return FileResponse(pdf_path, media_type='application/pdf', filename=f"Lab_Report_{patient.name}.pdf")
 
@@ -355,16 +639,13 @@ async def export_passport(
     patient_id: int = Form(...), 
     password: str = Form(...),
     hours: int = Form(24),
-    carrier_image: Optional[UploadFile] = File(None) # <--- NEW OPTIONAL FILE
+    carrier_image: Optional[UploadFile] = File(None), # <--- NEW OPTIONAL FILE
+    scratch: UploadScratch = Depends(upload_scratch)
 ):
     if carrier_image:
         # STEALTH MODE
-        temp_img_path = os.path.join(UPLOAD_DIR, carrier_image.filename)
-        with open(temp_img_path, "wb") as buffer:
-            shutil.copyfileobj(carrier_image.file, buffer)
-            
-        file_path = passport_service.generate_stealth_passport(patient_id, password, temp_img_path, hours)
-        os.remove(temp_img_path)
+        carrier = await scratch.read(carrier_image, "image")
+        file_path = passport_service.generate_stealth_passport(patient_id, password, carrier.read_bytes(), hours)
     else:
         # STANDARD MODE
         file_path = passport_service.generate_passport(patient_id, password, hours)
@@ -380,14 +661,9 @@ async def export_passport(
 
 # 24. IMPORT PASSPORT
 @app.post("/passport/import/")
-async def import_passport(file: UploadFile = File(...), password: str = Form(...)):
-    # Save uploaded file temporarily
-    temp_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    result = passport_service.import_passport(temp_path, password)
-    os.remove(temp_path) # Cleanup
+async def import_passport(file: UploadFile = File(...), password: str = Form(...), scratch: UploadScratch = Depends(upload_scratch)):
+    passport = await scratch.read(file, "passport")
+    result = passport_service.import_passport(passport.read_bytes(), password)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -397,14 +673,11 @@ async def import_passport(file: UploadFile = File(...), password: str = Form(...
 # 25. PEEK PASSPORT (Preview before Merge)
 # 25. PEEK PASSPORT (Updated with AI Audit)
 @app.post("/passport/peek/")
-async def peek_passport(file: UploadFile = File(...), password: str = Form(...)):
-    temp_path = os.path.join(UPLOAD_DIR, f"peek_{file.filename}")
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
+async def peek_passport(file: UploadFile = File(...), password: str = Form(...), scratch: UploadScratch = Depends(upload_scratch)):
+    passport = await scratch.read(file, "passport")
+
     # 1. Decrypt & Get Preview
-    result = passport_service.preview_passport(temp_path, password)
-    os.remove(temp_path)
+    result = passport_service.preview_passport(passport.read_bytes(), password)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -412,22 +685,21 @@ async def peek_passport(file: UploadFile = File(...), password: str = Form(...))
     # 2. AI CUSTOMS OFFICER (Conflict Check)
     # Check if this patient exists locally by Name (fuzzy match or exact)
     # For MVP, we use exact name match from the registry
-    all_patients = registry_service.get_all_patients()
-    local_match = next((p for p in all_patients if p.name.lower() == result['name'].lower()), None)
+    # Short read session: released before the (slow) audit call
+    local_summary = None
+    with registry_service.session() as db:
+        local_match = registry_service.find_patient_by_name(result['name'], db)
+        if local_match:
+            # Prepare summaries
+            local_summary = {
+                "name": local_match.name,
+                "history": local_match.medical_history,
+                "latest_consult": local_match.consultations[-1].soap_note[:100] if local_match.consultations else "None"
+            }
     
     audit_report = None
     
-    if local_match:
-        # Fetch full local details for comparison
-        full_local = registry_service.get_patient(local_match.id)
-        
-        # Prepare summaries
-        local_summary = {
-            "name": full_local.name,
-            "history": full_local.medical_history,
-            "latest_consult": full_local.consultations[-1].soap_note[:100] if full_local.consultations else "None"
-        }
-        
+    if local_summary:
         incoming_summary = {
             "name": result['name'],
             "history": result['history_preview'], # We used 'history_preview' in passport.py, might need full history
@@ -437,13 +709,8 @@ async def peek_passport(file: UploadFile = File(...), password: str = Form(...))
         }
         
         # Call House
-        import json
-        audit_json = house_service.audit_passport(local_summary, incoming_summary)
-        try:
-            audit_report = json.loads(audit_json)
-        except:
-            audit_report = {"has_conflict": False, "note": "Audit parsing failed"}
-            
+        audit_report = house_service.audit_passport(local_summary, incoming_summary)
+
     result["audit"] = audit_report
     return result
 
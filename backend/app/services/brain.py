@@ -1,14 +1,16 @@
-import ollama
-import json
-from app.services.knowledge import knowledge_service
+from app.services.llm import llm_gateway
+from app.services.structured import SoapNote, StructuredOutputError
+from app.services.knowledge import knowledge_service, SOURCE_DELIMITER
+from app.services.prompts import PromptBudget, Section
+
+EXPLAIN_PROMPT_VERSION = "explain-v1"  # Response cache key; bump when the prompt changes
 
 class BrainService:
     def __init__(self, model="llama3.2"):
         self.model = model
+        self.budget = PromptBudget(model)
 
-    def generate_soap_note(self, transcript: str, use_rag: bool = True):
-        print(f"Thinking with {self.model}... (RAG: {use_rag})")
-        
+    def _build_prompt(self, transcript: str, use_rag: bool = True):
         # 1. Split Vision/Audio (Do this FIRST)
         visual_section = "None"
         audio_section = transcript
@@ -26,8 +28,26 @@ class BrainService:
             # Only search if toggle is ON
             research_context = knowledge_service.search_knowledge(audio_section[:500])
         
-        # 3. The "Strict" Prompt (No Hallucination Examples)
-        prompt = f"""
+        # 3. Fit everything into the context window (complaint keeps its start and end,
+        #    protocol chunks are ranked so the best ones survive)
+        template = self._template("", "", "")
+        fitted = self.budget.fit(
+            "SOAP note", template,
+            transcript=Section(audio_section, weight=4, keep="middle"),
+            visuals=Section(visual_section, weight=1),
+            protocol=Section(research_context, weight=3, keep="salient", separator=SOURCE_DELIMITER),
+        )
+        prompt = self._template(fitted["transcript"], fitted["visuals"], fitted["protocol"])
+
+        messages = [
+            {'role': 'system', 'content': 'You are a JSON parser. Output only raw JSON.'},
+            {'role': 'user', 'content': prompt},
+        ]
+        return messages, audio_section, visual_section
+
+    def _template(self, audio_section: str, visual_section: str, research_context: str):
+        # The "Strict" Prompt (No Hallucination Examples)
+        return f"""
         You are a Clinical Data Parser. Your goal is strict fidelity to the input.
         
         INPUT DATA:
@@ -46,25 +66,58 @@ class BrainService:
              - NO (or if Protocol is "No knowledge base provided") -> Write a standard medical plan based on the Assessment.
 
         OUTPUT FORMAT (JSON):
-        Return ONLY valid JSON with keys: "subjective", "objective", "assessment", "plan".
+        Return JSON with keys: "subjective", "objective", "assessment", "plan".
         """
 
-        response = ollama.chat(model=self.model, messages=[
-            {'role': 'system', 'content': 'You are a JSON parser. Output only raw JSON.'},
-            {'role': 'user', 'content': prompt},
-        ])
-        
-        content = response['message']['content']
-        clean_content = content.replace("```json", "").replace("```", "").strip()
-        
+    def generate_soap_note(self, transcript: str, use_rag: bool = True):
+        print(f"Thinking with {self.model}... (RAG: {use_rag})")
+        messages, audio_section, visual_section = self._build_prompt(transcript, use_rag)
+
+        try:
+            note = llm_gateway.chat_json(self.model, messages, SoapNote)
+        except StructuredOutputError as e:
+            print(f"⚠️ SOAP note incomplete: {e}")
+            return self._fallback_note(audio_section, visual_section)
+        return self._format_note(note)
+
+    def stream_soap_note(self, transcript: str, use_rag: bool = True):
+        """
+        Streaming variant: yields ("token", text) while Llama writes the note,
+        ("section", {"section": name, "text": text}) as soon as each SOAP section is complete,
+        then a final ("soap_note", note) with the formatted result.
+        """
+        print(f"Streaming with {self.model}... (RAG: {use_rag})")
+        messages, audio_section, visual_section = self._build_prompt(transcript, use_rag)
+
         try:
-            data = json.loads(clean_content)
-            return f"""Subjective: {data.get('subjective')}
-Objective: {data.get('objective')}
-Assessment: {data.get('assessment')}
-Plan: {data.get('plan')}"""
-        except:
-            # Fallback if JSON fails (rare)
-            return f"Subjective: {audio_section}\nObjective: {visual_section}\nAssessment: Assessment Pending\nPlan: Clinical Review Required"
+            for kind, value in llm_gateway.stream_json(self.model, messages, SoapNote):
+                if kind == "token":
+                    yield "token", value
+                elif kind == "field":
+                    yield "section", {"section": value[0], "text": value[1]}
+                elif kind == "result":
+                    yield "soap_note", self._format_note(value)
+        except StructuredOutputError as e:
+            print(f"⚠️ SOAP note incomplete: {e}")
+            yield "soap_note", self._fallback_note(audio_section, visual_section)
+
+    def _format_note(self, note: SoapNote):
+        return f"""Subjective: {note.subjective}
+Objective: {note.objective}
+Assessment: {note.assessment}
+Plan: {note.plan}"""
+
+    def _fallback_note(self, audio_section: str, visual_section: str):
+        # Only when generation was cut short (timeout / token limit)
+        return f"Subjective: {audio_section}\nObjective: {visual_section}\nAssessment: Assessment Pending\nPlan: Clinical Review Required"
+
+    # --- PATIENT EXPLANATION ---
+    def explain_messages(self, soap_note: str, patient_name: str):
+        prompt = f"""You are a compassionate medical assistant speaking directly to {patient_name}. INPUT: "{soap_note}". TASK: Summarize the Plan for the patient in simple, warm language."""
+        return [{'role': 'user', 'content': prompt}]
+
+    def explain_plan(self, soap_note: str, patient_name: str):
+        response = llm_gateway.chat(model=self.model, messages=self.explain_messages(soap_note, patient_name), cache_version=EXPLAIN_PROMPT_VERSION)
+        return response['message']['content']
 
 brain_service = BrainService()
\ No newline at end of file
@@ -0,0 +1,171 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_sha256(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+class DocumentCatalog:
+    """
+    What is in the vector index, per document: file hash, per-page text hashes and the ids of
+    every chunk (chunk id = hash of file name + page + text, also used as the Chroma id).
+    Lets ingestion skip unchanged files/pages/chunks and deletion remove exactly the right vectors.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                filename TEXT PRIMARY KEY,
+                sha256 TEXT,
+                pages INTEGER NOT NULL DEFAULT 0,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                ingested_at REAL,
+                ingest_seconds REAL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                filename TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (filename, page)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                page INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks(filename, page);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+
+    # --- READS ---
+    def document(self, filename: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename, sha256, pages, chunks, ingested_at, ingest_seconds FROM documents WHERE filename = ?",
+                (filename,),
+            ).fetchone()
+        return self._doc(row) if row else None
+
+    def documents(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, sha256, pages, chunks, ingested_at, ingest_seconds FROM documents ORDER BY filename"
+            ).fetchall()
+        return [self._doc(r) for r in rows]
+
+    def _doc(self, row):
+        return {
+            "filename": row[0],
+            "sha256": row[1],
+            "pages": row[2],
+            "chunks": row[3],
+            "ingested_at": datetime.fromtimestamp(row[4]).isoformat() if row[4] else None,
+            "ingest_seconds": row[5],
+        }
+
+    def page_hashes(self, filename: str):
+        with self._lock:
+            rows = self._conn.execute("SELECT page, sha256 FROM pages WHERE filename = ?", (filename,)).fetchall()
+        return dict(rows)
+
+    def chunk_ids(self, filename: str):
+        """{page: set(chunk ids)} currently indexed for a document."""
+        by_page = {}
+        with self._lock:
+            for chunk_id, page in self._conn.execute("SELECT id, page FROM chunks WHERE filename = ?", (filename,)):
+                by_page.setdefault(page, set()).add(chunk_id)
+        return by_page
+
+    def known_ids(self):
+        with self._lock:
+            return {r[0] for r in self._conn.execute("SELECT id FROM chunks")}
+
+    # --- WRITES ---
+    def apply(self, filename: str, sha256: str, pages: dict, added, removed, seconds: float):
+        """Records one finished (re-)ingest: new page hashes, chunk ids added [(id, page)] / removed [id]."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE filename = ?", (filename,))
+            self._conn.executemany(
+                "INSERT INTO pages (filename, page, sha256) VALUES (?, ?, ?)",
+                [(filename, page, sha) for page, sha in pages.items()],
+            )
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in removed])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, filename, page) VALUES (?, ?, ?)",
+                [(i, filename, page) for i, page in added],
+            )
+            chunks = self._conn.execute("SELECT COUNT(*) FROM chunks WHERE filename = ?", (filename,)).fetchone()[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (filename, sha256, pages, chunks, ingested_at, ingest_seconds) VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, sha256, len(pages), chunks, time.time(), round(seconds, 2)),
+            )
+            self._conn.commit()
+
+    def adopt(self, entries):
+        """Registers vectors indexed before the catalog existed: [(id, filename, page)]."""
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO chunks (id, filename, page) VALUES (?, ?, ?)", entries)
+            for filename in {e[1] for e in entries}:
+                chunks = self._conn.execute("SELECT COUNT(*) FROM chunks WHERE filename = ?", (filename,)).fetchone()[0]
+                # No hash: the next ingest of this file re-indexes it and drops the old vectors
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (filename, sha256, pages, chunks) VALUES (?, NULL, 0, ?)",
+                    (filename, chunks),
+                )
+            self._conn.commit()
+
+    def remove(self, filename: str):
+        """Forgets a document; returns the chunk ids that must be deleted from the index."""
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute("SELECT id FROM chunks WHERE filename = ?", (filename,))]
+            self._conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self._conn.execute("DELETE FROM pages WHERE filename = ?", (filename,))
+            self._conn.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            self._conn.commit()
+        return ids
+
+    @property
+    def generation(self) -> int:
+        """
+        Library version: changes on every ingest or delete (retrieval caches key on it). Read from
+        the database each time so other workers' bumps are seen (one primary-key lookup).
+        """
+        return int(self.get_meta("generation", 0))
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            # One statement: two workers bumping together still get distinct generations
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+            )
+            generation = int(self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0])
+            self._conn.commit()
+        return generation
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            self._conn.commit()
@@ -0,0 +1,67 @@
+import threading
+import time
+
+class LazyResource:
+    """An expensive object (model, vector store, DB schema) built on first use, at most once."""
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.error = None
+        self.load_seconds = None
+
+    def get(self):
+        if self.loaded:
+            return self._value
+        with self._lock:
+            if not self.loaded:
+                print(f"⏳ Loading {self.name}...")
+                started = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    print(f"❌ Failed to load {self.name}: {e}")
+                    raise
+                self.error = None
+                self.load_seconds = round(time.perf_counter() - started, 2)
+                self.loaded = True
+                print(f"✅ {self.name} ready in {self.load_seconds}s")
+        return self._value
+
+    def status(self):
+        return {"loaded": self.loaded, "load_seconds": self.load_seconds, "error": self.error}
+
+class ServiceContainer:
+    """
+    Registry of the heavy resources behind the service singletons. Nothing is built at
+    import time: resources load on first use, or ahead of time via warmup().
+    """
+    def __init__(self):
+        self.resources = {}
+
+    def register(self, name: str, factory) -> LazyResource:
+        resource = LazyResource(name, factory)
+        self.resources[name] = resource
+        return resource
+
+    def warmup(self):
+        """Loads every resource in background threads (returns immediately)."""
+        for resource in self.resources.values():
+            threading.Thread(target=self._load_quietly, args=(resource,), name=f"warmup-{resource.name}", daemon=True).start()
+
+    def _load_quietly(self, resource: LazyResource):
+        try:
+            resource.get()
+        except Exception:
+            pass  # Recorded on the resource; /health/ready reports it
+
+    def ready(self) -> bool:
+        return all(r.loaded for r in self.resources.values())
+
+    def status(self):
+        return {name: r.status() for name, r in self.resources.items()}
+
+container = ServiceContainer()
@@ -0,0 +1,49 @@
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# Configuration
+DATABASE_URL = os.getenv("VITALIS_DATABASE_URL", "sqlite:///./vitalis.db")
+READ_DATABASE_URL = os.getenv("VITALIS_READ_DATABASE_URL", DATABASE_URL)   # A replica, or the same file
+WRITE_POOL_SIZE = int(os.getenv("VITALIS_DB_WRITE_POOL", "4"))    # SQLite has one writer at a time anyway
+READ_POOL_SIZE = int(os.getenv("VITALIS_DB_READ_POOL", "16"))     # WAL readers never block each other
+MAX_OVERFLOW = 8
+POOL_TIMEOUT = 10                                                 # Seconds to wait for a free connection
+BUSY_TIMEOUT_MS = int(os.getenv("VITALIS_DB_BUSY_TIMEOUT_MS", "5000"))
+
+def make_engine(url: str, read_only: bool = False, pool_size: int = 5):
+    """Pooled engine. SQLite connections get WAL, synchronous=NORMAL and a busy timeout."""
+    sqlite = url.startswith("sqlite")
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_MS / 1000} if sqlite else {},
+        pool_size=pool_size,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_pre_ping=not sqlite,
+    )
+    if sqlite:
+        @event.listens_for(engine, "connect")
+        def configure(connection, _record):
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")   # Readers and the writer stop blocking each other
+            cursor.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; no fsync per commit
+            cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+    return engine
+
+write_engine = make_engine(DATABASE_URL, pool_size=WRITE_POOL_SIZE)
+read_engine = make_engine(READ_DATABASE_URL, read_only=True, pool_size=READ_POOL_SIZE)
+
+# expire_on_commit=False: objects stay readable after the request's session is gone
+WriteSession = sessionmaker(bind=write_engine, autoflush=False, expire_on_commit=False)
+ReadSession = sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
+
+def pool_stats():
+    return {
+        "write": write_engine.pool.status(),
+        "read": read_engine.pool.status() if read_engine is not write_engine else "shared",
+    }
@@ -0,0 +1,109 @@
+import numpy as np
+from app.services.hearing import hearing_service, SAMPLE_RATE
+
+# Configuration
+STEP_SECONDS = 1.0        # Re-decode the live window after this much new audio
+COMMIT_MARGIN = 1.5       # Segments ending this long before "now" won't change anymore -> final
+MAX_WINDOW_SECONDS = 25   # Whisper sees at most 30s; force-commit before the window gets there
+MIN_WINDOW_SECONDS = 0.5
+DICTATION_BEAM_SIZE = 1   # Greedy decoding: latency matters more than the last % of accuracy
+
+class DictationSession:
+    """
+    Live dictation state for one WebSocket. Audio frames accumulate in a sliding window of
+    not-yet-final audio; each step re-transcribes that window, emits the stable leading
+    segments as final (and drops their audio) and the unstable tail as a partial.
+    """
+    def __init__(self, encoding: str = "pcm16", sample_rate: int = SAMPLE_RATE, beam_size: int = DICTATION_BEAM_SIZE):
+        if encoding not in ("pcm16", "opus"):
+            raise ValueError("encoding must be 'pcm16' or 'opus'")
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.beam_size = beam_size
+        self.window = np.zeros(0, dtype=np.float32)
+        self.window_start = 0.0   # Where the window begins on the session timeline (seconds)
+        self.new_samples = 0
+        self.final_segments = []
+        self._opus = None
+        self._resampler = None
+        if encoding == "opus":
+            import av
+            # Raw Opus packets (e.g. WebCodecs AudioEncoder output), 48kHz
+            self._opus = av.CodecContext.create("opus", "r")
+            self._resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+
+    # --- INPUT ---
+    def feed(self, frame: bytes):
+        samples = self._decode_opus(frame) if self._opus else self._decode_pcm(frame)
+        self.window = np.concatenate([self.window, samples])
+        self.new_samples += len(samples)
+
+    def ready(self) -> bool:
+        return self.new_samples >= STEP_SECONDS * SAMPLE_RATE
+
+    def _decode_pcm(self, frame: bytes) -> np.ndarray:
+        if len(frame) % 2:
+            raise ValueError(f"pcm16 frames must hold whole 16-bit samples (got {len(frame)} bytes)")
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32) / 32768.0
+        if self.sample_rate != SAMPLE_RATE and len(samples):
+            # Linear resample to Whisper's 16kHz
+            positions = np.arange(0, len(samples), self.sample_rate / SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+        return samples
+
+    def _decode_opus(self, frame: bytes) -> np.ndarray:
+        import av
+        chunks = []
+        for decoded in self._opus.decode(av.Packet(frame)):
+            for resampled in self._resampler.resample(decoded):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        return np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, dtype=np.float32)
+
+    # --- DECODING ---
+    def step(self, final: bool = False):
+        """Transcribes the live window (blocking; run it on an executor). Returns events to send."""
+        self.new_samples = 0
+        duration = len(self.window) / SAMPLE_RATE
+        if duration < MIN_WINDOW_SECONDS:
+            return []
+
+        # Not batched: the commit logic needs per-segment timestamps
+        segments = hearing_service.pool.submit(self.window, self.beam_size, allow_batch=False).result()
+
+        if final or duration >= MAX_WINDOW_SECONDS:
+            committed = list(segments)
+        else:
+            # The last segment is always still in flux; earlier ones are final once far enough back
+            committed = []
+            for segment in segments[:-1]:
+                if segment.end > duration - COMMIT_MARGIN:
+                    break
+                committed.append(segment)
+
+        events = []
+        for segment in committed:
+            text = segment.text.strip()
+            if not text:
+                continue
+            self.final_segments.append(text)
+            events.append({
+                "type": "final",
+                "start": round(self.window_start + segment.start, 2),
+                "end": round(self.window_start + segment.end, 2),
+                "text": text,
+            })
+
+        if committed or final or duration >= MAX_WINDOW_SECONDS:
+            # (A full window of pure silence is dropped as well)
+            cut = len(self.window) if len(committed) == len(segments) else int(committed[-1].end * SAMPLE_RATE)
+            self.window = self.window[cut:]
+            self.window_start += cut / SAMPLE_RATE
+
+        tail = " ".join(s.text.strip() for s in segments[len(committed):]).strip()
+        if tail:
+            events.append({"type": "partial", "text": tail})
+        return events
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(self.final_segments).strip()
@@ -0,0 +1,145 @@
+import os
+import time
+from langchain_core.embeddings import Embeddings
+
+# Configuration
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+BACKEND = os.getenv("VITALIS_EMBEDDINGS", "onnx")              # onnx | torch
+INT8 = os.getenv("VITALIS_EMBEDDINGS_INT8", "0") == "1"        # Dynamic int8 quantization (vectors drift ~1%)
+THREADS = int(os.getenv("VITALIS_EMBEDDING_THREADS", str(min(4, os.cpu_count() or 1))))
+ONNX_MODEL = os.getenv("VITALIS_ONNX_MODEL")                   # Local .onnx instead of the cached Hub export
+ONNX_TOKENIZER = os.getenv("VITALIS_ONNX_TOKENIZER")           # Local tokenizer.json (default: next to ONNX_MODEL, else the HF cache)
+MAX_TOKENS = 256                                               # all-MiniLM-L6-v2 max_seq_length
+PARITY = os.getenv("VITALIS_EMBEDDINGS_PARITY", "0") == "1"    # Compare against torch at load
+PARITY_MIN_COSINE = 0.99
+PARITY_TEXTS = [
+    "Sepsis: start broad-spectrum antibiotics within one hour of recognition.",
+    "Thunderclap headache requires urgent CT to exclude subarachnoid haemorrhage.",
+    "Penicillin allergy: avoid amoxicillin; consider cross-reactivity with cephalosporins.",
+    "Lactate > 2 mmol/L with hypotension despite fluids defines septic shock.",
+    "BP 142/91, HR 104, SpO2 95% on room air.",
+]
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime: no torch import, fixed intra-op threads, batched
+    tokenization with length-sorted batches (little padding), mean pooling + L2 normalization
+    like the sentence-transformers pipeline. Implements the langchain Embeddings interface.
+    """
+    def __init__(self, model_name: str = EMBEDDING_MODEL, quantize: bool = INT8, threads: int = THREADS, batch_size: int = 64, cache_dir: str = "knowledge_db"):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+        path = ONNX_MODEL or local_file(model_name, "onnx/model.onnx")
+        if quantize:
+            path = self._quantized(path, cache_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        tokenizer = ONNX_TOKENIZER or (ONNX_MODEL and os.path.join(os.path.dirname(ONNX_MODEL), "tokenizer.json"))
+        if not tokenizer or not os.path.exists(tokenizer):
+            tokenizer = local_file(model_name, "tokenizer.json")
+        self.tokenizer = Tokenizer.from_file(tokenizer)
+        self.tokenizer.enable_truncation(max_length=MAX_TOKENS)
+        self.tokenizer.enable_padding()
+        self.label = f"onnx{'-int8' if quantize else ''} ({threads} threads)"
+
+    def _quantized(self, path: str, cache_dir: str) -> str:
+        target = os.path.join(cache_dir, "onnx", "model_int8.onnx")
+        if not os.path.exists(target):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            print("🧮 Quantizing the embedding model to int8...")
+            quantize_dynamic(path, target, weight_type=QuantType.QInt8)
+        return target
+
+    def _embed(self, texts):
+        import numpy as np
+
+        vectors = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encoded = self.tokenizer.encode_batch([texts[i] for i in batch])
+            mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feed = {
+                "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encoded], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self.input_names})[0]
+            pooled = (hidden * mask[..., None]).sum(axis=1) / np.clip(mask.sum(axis=1, keepdims=True), 1, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, vector in zip(batch, pooled):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts))
+
+    def embed_query(self, text: str):
+        return self._embed([text])[0]
+
+def local_file(repo_id: str, filename: str) -> str:
+    """A file of a Hub repo from the local HF cache only: the clinic deployment never downloads."""
+    from huggingface_hub import hf_hub_download
+    from huggingface_hub.errors import LocalEntryNotFoundError
+    try:
+        return hf_hub_download(repo_id, filename, local_files_only=True)
+    except LocalEntryNotFoundError:
+        raise FileNotFoundError(f"{repo_id}/{filename} is not in the HF cache "
+                                f"(huggingface-cli download {repo_id} {filename}, or set VITALIS_ONNX_MODEL)") from None
+
+def torch_embeddings(batch_size: int = 64, threads: int = THREADS):
+    import torch
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+    torch.set_num_threads(threads)
+    return SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL.split("/")[-1], encode_kwargs={"batch_size": batch_size})
+
+def parity_check(embeddings, texts=PARITY_TEXTS):
+    """Cosine similarity of `embeddings` vs the torch reference on the same texts, plus timings."""
+    import numpy as np
+
+    reference = torch_embeddings()
+    started = time.perf_counter()
+    ours = np.array(embeddings.embed_documents(texts))
+    ours_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    theirs = np.array(reference.embed_documents(texts))
+    theirs_seconds = time.perf_counter() - started
+    cosine = (ours * theirs).sum(axis=1) / (np.linalg.norm(ours, axis=1) * np.linalg.norm(theirs, axis=1))
+    return {
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+        "seconds": round(ours_seconds, 4),
+        "torch_seconds": round(theirs_seconds, 4),
+    }
+
+def load_embeddings(batch_size: int = 64, backend: str = BACKEND):
+    """The configured embedding backend; falls back to torch if ONNX can't load (or fails parity)."""
+    if backend == "onnx":
+        try:
+            embeddings = OnnxEmbeddings(batch_size=batch_size)
+            if PARITY:
+                report = parity_check(embeddings)
+                print(f"🧪 Embedding parity vs torch: {report}")
+                if report["min_cosine"] < PARITY_MIN_COSINE:
+                    raise ValueError(f"min cosine {report['min_cosine']} < {PARITY_MIN_COSINE}")
+            print(f"🧠 Embeddings: {embeddings.label}")
+            return embeddings
+        except Exception as e:
+            print(f"⚠️ ONNX embeddings unavailable ({e}); using torch.")
+    embeddings = torch_embeddings(batch_size)
+    print(f"🧠 Embeddings: {embedding_label(embeddings)}")
+    return embeddings
+
+def embedding_label(embeddings) -> str:
+    """Which backend a loaded embedding function really is (load_embeddings may have fallen back)."""
+    return getattr(embeddings, "label", None) or f"torch ({THREADS} threads)"
@@ -1,26 +1,306 @@
 import os
-from faster_whisper import WhisperModel
+import heapq
+import itertools
+import queue
+import threading
+import time
+import hashlib
+import dataclasses
+from bisect import bisect_right
+from concurrent.futures import Future, InvalidStateError
+import numpy as np
+from app.services.scheduler import current_priority
+from app.services.longform import LongformTranscriber, StitchedSegment, LONG_AUDIO_SECONDS, CHUNK_SECONDS
+from app.services.container import container
+from app.services.cache import DiskCache, make_key
 
 # Configuration
 MODEL_SIZE = "base.en"  # "base.en" is fast. Use "small.en" or "medium.en" for better accuracy later.
-DEVICE = "cpu"          # faster-whisper runs great on M3 CPU. 
+DEVICE = "cpu"          # faster-whisper runs great on M3 CPU.
 COMPUTE_TYPE = "int8"   # Quantization for speed
 
+# Pool sizing: one replica per THREADS_PER_REPLICA cores (e.g. 8 replicas on a 32-core server)
+THREADS_PER_REPLICA = int(os.getenv("VITALIS_WHISPER_THREADS", "4"))
+REPLICAS = int(os.getenv("VITALIS_WHISPER_REPLICAS", str(max(1, (os.cpu_count() or 4) // THREADS_PER_REPLICA))))
+
+DEFAULT_BEAM_SIZE = 5     # 1 = greedy (fastest), 5 = most accurate
+SAMPLE_RATE = 16000
+SHORT_CLIP_SECONDS = 30   # Clips that fit in one Whisper window can be decoded together (longer ones decode alone)
+MAX_BATCH = 8
+
+# Transcript cache (retries / re-submits of the same recording skip Whisper entirely)
+TRANSCRIPT_CACHE_BYTES = int(os.getenv("VITALIS_TRANSCRIPT_CACHE_MB", "256")) * 1024 * 1024
+
+class TranscriptionRequest:
+    def __init__(self, audio: np.ndarray, beam_size: int, priority: int, on_segment=None, allow_batch=True):
+        self.audio = audio
+        self.allow_batch = allow_batch
+        self.beam_size = beam_size
+        self.priority = priority
+        self.on_segment = on_segment
+        self.future = Future()
+        self.duration = len(audio) / SAMPLE_RATE
+
+    @property
+    def batchable(self):
+        # Streaming requests need their segments one by one, so they are decoded alone
+        return self.allow_batch and self.on_segment is None and self.duration <= SHORT_CLIP_SECONDS
+
+class WhisperPool:
+    """
+    Transcription engine: REPLICAS copies of the model (CTranslate2 `num_workers`), one worker
+    thread per replica, fed from a priority queue. Short clips waiting together with the same
+    beam size are decoded as a single batch.
+    """
+    def __init__(self, replicas: int = REPLICAS, threads: int = THREADS_PER_REPLICA):
+        from faster_whisper import WhisperModel, BatchedInferencePipeline
+        print(f"Loading Whisper Model ({MODEL_SIZE}) x{replicas} replicas, {threads} threads each...")
+        self.replicas = replicas
+        self.model = WhisperModel(MODEL_SIZE, device=DEVICE, compute_type=COMPUTE_TYPE,
+                                  cpu_threads=threads, num_workers=replicas)
+        self.batched = BatchedInferencePipeline(model=self.model)
+
+        self._pending = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._completed = 0
+        self._batches = 0
+        self._batched_clips = 0
+        self._audio_seconds = 0.0
+        self._decode_seconds = 0.0
+
+        for i in range(replicas):
+            threading.Thread(target=self._work, name=f"whisper-{i}", daemon=True).start()
+        print("Whisper Model Loaded.")
+
+    def submit(self, audio, beam_size=None, on_segment=None, allow_batch=True) -> Future:
+        # Decode to 16kHz PCM on the caller's thread so replicas only ever run the model
+        samples = audio if isinstance(audio, np.ndarray) else decode_pcm(audio)
+        request = TranscriptionRequest(samples, beam_size or DEFAULT_BEAM_SIZE, current_priority.get(), on_segment, allow_batch)
+        with self._cond:
+            heapq.heappush(self._pending, (request.priority, next(self._counter), request))
+            self._cond.notify()
+        return request.future
+
+    def stats(self):
+        with self._cond:
+            return {
+                "replicas": self.replicas,
+                "queue_depth": len(self._pending),
+                "busy_replicas": self._busy,
+                "completed": self._completed,
+                "batches": self._batches,
+                "batched_clips": self._batched_clips,
+                # Seconds of audio per second of decoding (higher is better)
+                "realtime_factor": round(self._audio_seconds / self._decode_seconds, 2) if self._decode_seconds else None,
+            }
+
+    def _take(self):
+        with self._cond:
+            first = None
+            while first is None:
+                while not self._pending:
+                    self._cond.wait()
+                _, _, first = heapq.heappop(self._pending)
+                if first.future.cancelled():
+                    first = None  # Caller gave up while queued
+            batch = [first]
+            if first.batchable:
+                skipped = []
+                while self._pending and len(batch) < MAX_BATCH:
+                    entry = heapq.heappop(self._pending)
+                    request = entry[2]
+                    if request.future.cancelled():
+                        continue
+                    if request.batchable and request.beam_size == first.beam_size:
+                        batch.append(request)
+                    else:
+                        skipped.append(entry)
+                for entry in skipped:
+                    heapq.heappush(self._pending, entry)
+            self._busy += 1
+            return batch
+
+    def _work(self):
+        while True:
+            batch = self._take()
+            started = time.perf_counter()
+            try:
+                if len(batch) == 1:
+                    self._run_single(batch[0])
+                else:
+                    self._run_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._completed += len(batch)
+                    self._audio_seconds += sum(r.duration for r in batch)
+                    self._decode_seconds += time.perf_counter() - started
+                    if len(batch) > 1:
+                        self._batches += 1
+                        self._batched_clips += len(batch)
+
+    def _run_single(self, request: TranscriptionRequest):
+        segments, info = self.model.transcribe(request.audio, beam_size=request.beam_size)
+        result = []
+        for segment in segments:
+            if request.future.cancelled():
+                return  # Caller gave up: dropping the generator stops the decode
+            result.append(segment)
+            if request.on_segment:
+                request.on_segment(segment)
+        _resolve(request, result)
+
+    def _run_batch(self, batch):
+        # Lay the clips end to end and decode each one as its own chunk in one batched pass.
+        # `batchable` keeps every clip within a single 30s window; longer audio goes to _run_single.
+        parts, clips, starts, offset = [], [], [], 0
+        for request in batch:
+            length = len(request.audio)
+            parts.append(request.audio.astype(np.float32, copy=False))
+            clips.append({"start": offset / SAMPLE_RATE, "end": (offset + length) / SAMPLE_RATE})  # Seconds
+            starts.append(offset / SAMPLE_RATE)
+            offset += length
+
+        segments, info = self.batched.transcribe(
+            np.concatenate(parts), beam_size=batch[0].beam_size, batch_size=len(batch),
+            clip_timestamps=clips, vad_filter=False,
+        )
+
+        grouped = [[] for _ in batch]
+        for segment in segments:
+            # Midpoint: starts are rounded to the millisecond and may land just before their clip
+            idx = max(0, bisect_right(starts, (segment.start + segment.end) / 2) - 1)
+            shift = starts[idx]
+            grouped[idx].append(dataclasses.replace(segment, start=max(0.0, segment.start - shift), end=segment.end - shift))
+
+        for request, result in zip(batch, grouped):
+            _resolve(request, result)
+
+def _resolve(request: TranscriptionRequest, result):
+    try:
+        request.future.set_result(result)
+    except InvalidStateError:
+        pass  # Cancelled by the caller while decoding
+
+def decode_pcm(audio) -> np.ndarray:
+    """Path or file-like -> 16kHz mono float32 (PyAV)."""
+    from faster_whisper import decode_audio
+    return decode_audio(audio, sampling_rate=SAMPLE_RATE)
+
+def content_digest(audio) -> str:
+    """sha256 of the raw upload (path, file-like or PCM array); file-likes are rewound afterwards."""
+    hasher = hashlib.sha256()
+    if isinstance(audio, np.ndarray):
+        hasher.update(audio.tobytes())
+    elif isinstance(audio, (str, os.PathLike)):
+        with open(audio, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+    else:
+        start = audio.tell()
+        while chunk := audio.read(1024 * 1024):
+            hasher.update(chunk)
+        audio.seek(start)
+    return hasher.hexdigest()
+
+_DONE = object()
+
 class HearingService:
     def __init__(self):
-        print(f"Loading Whisper Model ({MODEL_SIZE})...")
-        # Run on CPU with INT8 for Mac efficiency
-        self.model = WhisperModel(MODEL_SIZE, device=DEVICE, compute_type=COMPUTE_TYPE)
-        print("Whisper Model Loaded.")
+        # The replica pool loads on first use or during startup warmup (see container.py)
+        self._pool = container.register("whisper", WhisperPool)
+        self.longform = LongformTranscriber(MODEL_SIZE, DEVICE, COMPUTE_TYPE)
+        self.cache = DiskCache("transcripts", TRANSCRIPT_CACHE_BYTES)
+
+    @property
+    def pool(self) -> WhisperPool:
+        return self._pool.get()
+
+    @property
+    def model(self):
+        return self.pool.model
+
+    def _decode(self, audio) -> np.ndarray:
+        # Decode once (PyAV); both the pool and long-audio mode work on the PCM array
+        return audio if isinstance(audio, np.ndarray) else decode_pcm(audio)
+
+    def _cache_key(self, audio, beam_size, content_hash):
+        # Same recording + same model/decoding settings = same transcript
+        return make_key(content_hash or content_digest(audio), MODEL_SIZE, COMPUTE_TYPE,
+                        beam_size or DEFAULT_BEAM_SIZE, LONG_AUDIO_SECONDS, CHUNK_SECONDS)
+
+    def _cached(self, key):
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        print("🎧 Transcript cache hit.")
+        return [StitchedSegment(start, end, text) for start, end, text in cached]
+
+    def _store(self, key, segments):
+        self.cache.set(key, [(s.start, s.end, s.text) for s in segments])
+
+    def stream_segments(self, audio, beam_size=None, content_hash=None):
+        """Yields faster-whisper segments as soon as each one is decoded. `audio` is a path or a file-like buffer."""
+        key = self._cache_key(audio, beam_size, content_hash)
+        cached = self._cached(key)
+        if cached is not None:
+            yield from cached
+            return
+
+        decoded = []
+        for segment in self._decode_segments(audio, beam_size):
+            decoded.append(segment)
+            yield segment
+        self._store(key, decoded)
+
+    def _decode_segments(self, audio, beam_size=None):
+        samples = self._decode(audio)
+        if len(samples) / SAMPLE_RATE >= LONG_AUDIO_SECONDS:
+            # Long recordings: VAD-trimmed chunks decoded in parallel processes
+            yield from self.longform.stream(samples, beam_size or DEFAULT_BEAM_SIZE)
+            return
+
+        segments = queue.Queue()
+        future = self.pool.submit(samples, beam_size, on_segment=segments.put)
+        future.add_done_callback(lambda f: segments.put(_DONE))
+        try:
+            while (segment := segments.get()) is not _DONE:
+                yield segment
+            future.result()  # Re-raise decoding errors
+        finally:
+            future.cancel()  # Closed early (client went away): the pool drops the request
+
+    def transcribe_audio(self, audio, beam_size=None, content_hash=None):
+        key = self._cache_key(audio, beam_size, content_hash)
+        segments = self._cached(key)
+        if segments is None:
+            samples = self._decode(audio)
+            if len(samples) / SAMPLE_RATE >= LONG_AUDIO_SECONDS:
+                segments = list(self.longform.stream(samples, beam_size or DEFAULT_BEAM_SIZE))
+            else:
+                segments = self.pool.submit(samples, beam_size).result()
+            self._store(key, segments)
 
-    def transcribe_audio(self, file_path: str):
-        segments, info = self.model.transcribe(file_path, beam_size=5)
-        
         full_text = ""
         for segment in segments:
             full_text += segment.text + " "
-            
+
         return full_text.strip()
 
+    def metrics(self):
+        stats = {"transcript_cache": self.cache.stats()}
+        if not self._pool.loaded:
+            return {**stats, "loaded": False}
+        return {**self.pool.stats(), "long_audio_processes": self.longform.processes, **stats}
+
+    def shutdown(self):
+        self.longform.shutdown()
+
 # Create a singleton instance
-hearing_service = HearingService()
\ No newline at end of file
+hearing_service = HearingService()
@@ -1,4 +1,9 @@
-import ollama
+from app.services.llm import llm_gateway
+from app.services.structured import PassportAudit
+
+# Prompt template versions (part of the response cache key: bump when a prompt changes)
+DDX_PROMPT_VERSION = "house-ddx-v1"
+LABS_PROMPT_VERSION = "house-labs-v1"
 
 class HouseAgent:
     def __init__(self, model="llama3.2"):
@@ -30,9 +35,9 @@ class HouseAgent:
         **3. [Diagnosis]:** [Reasoning]
         """
 
-        response = ollama.chat(model=self.model, messages=[
+        response = llm_gateway.chat(model=self.model, messages=[
             {'role': 'user', 'content': prompt},
-        ])
+        ], cache_version=DDX_PROMPT_VERSION)
         
         return response['message']['content']
 
@@ -62,9 +67,9 @@ class HouseAgent:
         Direct clinical insight only. No "Here is the analysis" fluff.
         """
 
-        response = ollama.chat(model=self.model, messages=[
+        response = llm_gateway.chat(model=self.model, messages=[
             {'role': 'user', 'content': prompt},
-        ])
+        ], cache_version=LABS_PROMPT_VERSION)
         
         return response['message']['content']
 
@@ -100,15 +105,12 @@ class HouseAgent:
         """
 
         try:
-            response = ollama.chat(model=self.model, messages=[
+            audit = llm_gateway.chat_json(self.model, [
                 {'role': 'system', 'content': 'You are a JSON conflict detector. Output ONLY valid JSON.'},
                 {'role': 'user', 'content': prompt}
-            ])
-            
-            # Clean and parse
-            content = response['message']['content'].replace("```json", "").replace("```", "").strip()
-            return content # Return raw string to be parsed by caller, or parse here
+            ], PassportAudit)
+            return audit.model_dump()
         except Exception as e:
-            return f'{{"has_conflict": false, "error": "{str(e)}"}}'
+            return {"has_conflict": False, "error": str(e)}
 
 house_service = HouseAgent()
\ No newline at end of file
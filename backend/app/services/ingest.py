@@ -0,0 +1,272 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.services.catalog import file_sha256, text_sha256
+
+# NOTE: imported by spawned parser processes - keep service singletons out of this module.
+
+# Configuration
+PROCESSES = int(os.getenv("VITALIS_INGEST_PROCESSES", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = 8      # Pages parsed per process-pool task (big manuals fan out across all cores)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+EMBED_BATCH = int(os.getenv("VITALIS_EMBED_BATCH", "64"))     # Sentence-transformer encode batch
+WRITE_BATCH = int(os.getenv("VITALIS_WRITE_BATCH", "256"))    # Chunks per Chroma write
+DELETE_BATCH = 5000
+
+# --- WORKER SIDE (runs in the process pool) ---
+
+def count_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def parse_pages(path: str, start: int, end: int):
+    """Extracts and splits pages [start, end) of one PDF. Returns ({page: text hash}, chunks)."""
+    from pypdf import PdfReader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    reader = PdfReader(path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    name = os.path.basename(path)
+    end = min(end, len(reader.pages))
+    hashes, chunks = {}, []
+    for page in range(start, end):
+        text = reader.pages[page].extract_text() or ""
+        hashes[page] = text_sha256(text)
+        for piece in splitter.split_text(text):
+            chunks.append({"id": text_sha256(name, page, piece), "text": piece, "metadata": {"source": path, "page": page}})
+    return hashes, chunks
+
+# --- PIPELINE ---
+
+class FileState:
+    """Diff of one document against the catalog while its pages come back from the pool."""
+    def __init__(self, path: str, sha256: str, old_pages: dict, old_chunks: dict):
+        self.path = path
+        self.sha256 = sha256
+        self.old_pages = old_pages
+        self.old_chunks = old_chunks
+        self.pages = {}
+        self.added = []
+        self.removed = []
+        self.outstanding = 0
+        self.started = time.perf_counter()
+        self.pages_skipped = 0
+        self.chunks_skipped = 0
+
+    def diff(self, hashes: dict, chunks):
+        """Chunks that still need embedding; records what disappears from changed pages."""
+        self.pages.update(hashes)
+        changed = {p for p, sha in hashes.items() if self.old_pages.get(p) != sha}
+        self.pages_skipped += len(hashes) - len(changed)
+        fresh, keep = [], {}
+        for chunk in chunks:
+            page = chunk["metadata"]["page"]
+            if page not in changed or chunk["id"] in keep.get(page, ()):
+                continue  # Unchanged page, or the same text twice on one page
+            keep.setdefault(page, set()).add(chunk["id"])
+            if chunk["id"] in self.old_chunks.get(page, ()):
+                self.chunks_skipped += 1
+                continue
+            fresh.append(chunk)
+            self.added.append((chunk["id"], page))
+        for page in changed:
+            self.removed.extend(self.old_chunks.get(page, set()) - keep.get(page, set()))
+        return fresh
+
+    def finish(self):
+        # Pages that no longer exist (document got shorter)
+        for page, ids in self.old_chunks.items():
+            if page not in self.pages:
+                self.removed.extend(ids)
+        return time.perf_counter() - self.started
+
+class IngestPipeline:
+    """
+    Parses PDF pages on a process pool (all cores), then embeds and writes the chunks to Chroma
+    in batches as parsed pages come back, so embedding overlaps with parsing. Every document is
+    diffed against the catalog: unchanged files are skipped, and only chunks of changed pages
+    that are not indexed yet get embedded. `store` returns the langchain Chroma store; the
+    optional `lexical` BM25 index receives the same chunk writes and deletes.
+    """
+    def __init__(self, store, catalog, lexical=None, processes: int = PROCESSES):
+        self._store = store
+        self.catalog = catalog
+        self.lexical = lexical
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._ingest_lock = threading.Lock()   # One ingest/delete at a time keeps catalog and index in step
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that holds torch / Whisper threads
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def ingest(self, paths, on_progress=None):
+        """Indexes every PDF in `paths`. Returns per-file chunk counts, errors and timings."""
+        with self._ingest_lock:
+            self._adopt_existing()
+            self._sync_lexical()
+            return self._ingest(paths, on_progress)
+
+    def _ingest(self, paths, on_progress):
+        started = time.perf_counter()
+        progress = {"files": len(paths), "pages_total": 0, "pages_parsed": 0, "chunks_indexed": 0}
+        files, errors, states = {}, {}, {}
+
+        futures = {}
+        for path in paths:
+            name = os.path.basename(path)
+            try:
+                sha = file_sha256(path)
+                known = self.catalog.document(name)
+                if known and known["sha256"] == sha:
+                    files[name] = {"status": "unchanged", "pages": known["pages"], "chunks": known["chunks"]}
+                    continue
+                pages = count_pages(path)
+            except Exception as e:
+                errors[name] = str(e)
+                continue
+            state = states[name] = FileState(path, sha, self.catalog.page_hashes(name), self.catalog.chunk_ids(name))
+            progress["pages_total"] += pages
+            for start in range(0, pages, PAGES_PER_TASK):
+                futures[self.executor.submit(parse_pages, path, start, start + PAGES_PER_TASK)] = name
+                state.outstanding += 1
+            if not state.outstanding:
+                self._finish(name, state, files)
+        self._report(on_progress, progress)
+
+        pending = []
+        for future in as_completed(futures):
+            name = futures[future]
+            state = states.get(name)
+            if state is None:
+                continue  # Another page range of this file failed
+            state.outstanding -= 1
+            try:
+                hashes, chunks = future.result()
+            except Exception as e:
+                # Leave the document as it was: drop what we already wrote for it
+                errors[name] = str(e)
+                states.pop(name)
+                pending = [c for c in pending if c["metadata"]["source"] != state.path]
+                self._delete(i for i, _ in state.added)
+                self.catalog.bump_generation()
+                continue
+            progress["pages_parsed"] += len(hashes)
+            pending.extend(state.diff(hashes, chunks))
+            while len(pending) >= WRITE_BATCH:
+                self._write(pending[:WRITE_BATCH])
+                progress["chunks_indexed"] += WRITE_BATCH
+                pending = pending[WRITE_BATCH:]
+            if not state.outstanding:
+                # Flush first: the catalog must never list chunks that aren't in the index
+                self._write(pending)
+                progress["chunks_indexed"] += len(pending)
+                pending = []
+                self._finish(name, state, files)
+            self._report(on_progress, progress)
+
+        seconds = time.perf_counter() - started
+        print(f"✅ Indexed {progress['chunks_indexed']} new chunks from {progress['pages_parsed']} pages in {seconds:.1f}s.")
+        return {
+            "files": files,
+            "errors": errors,
+            "chunks_indexed": progress["chunks_indexed"],
+            "pages": progress["pages_parsed"],
+            "seconds": round(seconds, 2),
+        }
+
+    def _finish(self, name: str, state: FileState, files: dict):
+        seconds = state.finish()
+        self._delete(state.removed)
+        self.catalog.apply(name, state.sha256, state.pages, state.added, state.removed, seconds)
+        if state.added or state.removed:
+            self.catalog.bump_generation()
+        files[name] = {
+            "status": "indexed",
+            "pages": len(state.pages),
+            "pages_skipped": state.pages_skipped,
+            "chunks_added": len(state.added),
+            "chunks_skipped": state.chunks_skipped,
+            "chunks_removed": len(state.removed),
+            "seconds": round(seconds, 2),
+        }
+
+    def remove(self, filename: str) -> int:
+        """Deletes a document's vectors from the index (and the catalog). Returns how many."""
+        with self._ingest_lock:
+            self._adopt_existing()
+            self._sync_lexical()
+            ids = self.catalog.remove(filename)
+            self._delete(ids)
+            self.catalog.bump_generation()
+        return len(ids)
+
+    def _adopt_existing(self):
+        # One-off: vectors indexed before the catalog existed get attributed to their file,
+        # so re-uploads replace them and deletes remove them
+        if self.catalog.get_meta("adopted") == "1":
+            return
+        existing = self._store().get(include=["metadatas"])
+        known = self.catalog.known_ids()
+        entries = [
+            (i, os.path.basename((m or {}).get("source", "Unknown")), int((m or {}).get("page", 0)))
+            for i, m in zip(existing["ids"], existing["metadatas"]) if i not in known
+        ]
+        if entries:
+            print(f"📚 Cataloguing {len(entries)} previously indexed chunks...")
+            self.catalog.adopt(entries)
+        self.catalog.set_meta("adopted", "1")
+
+    def _sync_lexical(self):
+        # The BM25 index follows the catalog; backfill chunks indexed before it existed
+        if self.lexical is None:
+            return
+        known, indexed = self.catalog.known_ids(), self.lexical.ids()
+        self.lexical.remove(indexed - known)
+        missing = list(known - indexed)
+        if not missing:
+            return
+        print(f"🔤 Adding {len(missing)} indexed chunks to the lexical index...")
+        for i in range(0, len(missing), DELETE_BATCH):
+            batch = self._store().get(ids=missing[i:i + DELETE_BATCH], include=["documents", "metadatas"])
+            self.lexical.add([
+                {"id": cid, "text": text or "", "metadata": meta or {}}
+                for cid, text, meta in zip(batch["ids"], batch["documents"], batch["metadatas"])
+            ])
+
+    def _write(self, chunks):
+        if not chunks:
+            return
+        # One embed call (batched by the encoder) + one Chroma upsert per batch
+        self._store().add_texts(
+            [c["text"] for c in chunks],
+            metadatas=[c["metadata"] for c in chunks],
+            ids=[c["id"] for c in chunks],
+        )
+        if self.lexical is not None:
+            self.lexical.add(chunks)
+
+    def _delete(self, ids):
+        ids = list(ids)
+        for i in range(0, len(ids), DELETE_BATCH):
+            self._store().delete(ids=ids[i:i + DELETE_BATCH])
+        if self.lexical is not None:
+            self.lexical.remove(ids)
+
+    def _report(self, on_progress, progress):
+        if on_progress:
+            on_progress(dict(progress))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+import uuid
+from datetime import datetime
+
+from app.services.scheduler import current_priority, resolve_priority
+
+# Configuration
+JOB_WORKERS = 8          # Jobs in flight. The real CPU cap is the per-model scheduler.
+MAX_FINISHED_JOBS = 500  # Finished jobs kept around for polling
+
+class Job:
+    def __init__(self, kind: str, run, priority: int, meta=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.priority = priority
+        self.meta = meta or {}
+        self.status = "queued"
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self._run = run
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def publish(self, event: str, data=None):
+        self.events.append({"event": event, "data": data or {}, "timestamp": datetime.now().isoformat()})
+        # Wake up subscribers, then arm a fresh event for the next change
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "progress": self.progress,
+            "meta": self.meta,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobManager:
+    """
+    Priority job queue for long running work (consultations, ingestion...).
+    Submit returns immediately with a job id; clients poll or subscribe for results.
+    """
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+        self._counter = itertools.count()
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, run, priority="routine", **meta) -> Job:
+        """`run` is an async callable receiving the Job; its return value becomes job.result."""
+        job = Job(kind, run, resolve_priority(priority), meta)
+        self.jobs[job.id] = job
+        self._queue.put_nowait((job.priority, next(self._counter), job))
+        job.publish("queued", {"position": self._queue.qsize()})
+        self._prune()
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def follow(self, job: Job):
+        """Yields every event of the job (past and future) until it finishes."""
+        seen = 0
+        while True:
+            changed = job._changed
+            while seen < len(job.events):
+                yield job.events[seen]
+                seen += 1
+            if job.finished:
+                return
+            await changed.wait()
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"queued": self._queue.qsize() if self._queue else 0, "by_status": counts}
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            job.status = "running"
+            job.started_at = datetime.now()
+            job.publish("running")
+            # Priority follows the job into the pipeline stages (see ModelScheduler)
+            token = current_priority.set(job.priority)
+            try:
+                result = await job._run(job)
+                job.result, job.finished_at, job.status = result, datetime.now(), "done"
+                job.publish("done", {"result": job.result})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error, job.finished_at, job.status = str(e), datetime.now(), "failed"
+                job.publish("failed", {"error": job.error})
+            finally:
+                current_priority.reset(token)
+                self._queue.task_done()
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.finished]
+        if len(finished) <= MAX_FINISHED_JOBS:
+            return
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self.jobs[job.id]
+
+job_manager = JobManager()
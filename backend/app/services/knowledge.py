@@ -1,45 +1,193 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from app.services.container import container
+from app.services.ingest import IngestPipeline, EMBED_BATCH
+from app.services.catalog import DocumentCatalog, text_sha256
+from app.services.lexical import LexicalIndex
+from app.services.embeddings import load_embeddings, embedding_label
+from app.services.vectors import NumpyVectorStore
+from app.services.cache import MemoryLRU, make_key
+
+LIBRARY_DIR = "library"
+# search_knowledge() output: one "[SOURCE: file, Page n]: text" block per chunk (chunks may contain blank lines)
+SOURCE_DELIMITER = re.compile(r"\n(?=\[SOURCE: )")
+QUERY_EMBEDDING_CACHE = 2048   # query text -> embedding
+RETRIEVAL_CACHE = 1024         # (embedding, k, library generation) -> top-k chunks
+VECTOR_STORE = os.getenv("VITALIS_VECTOR_STORE", "chroma")   # chroma | numpy (mmap'd exact search)
+
+# Hybrid retrieval: BM25 + vector ranks fused with reciprocal rank fusion
+RETRIEVAL_MODE = os.getenv("VITALIS_RETRIEVAL", "hybrid")   # hybrid | vector | lexical
+RRF_K = 60
+CANDIDATES = 10   # Depth of each ranked list before fusion (the caller's k is unchanged)
+LEXICAL_BUDGET_MS = float(os.getenv("VITALIS_LEXICAL_BUDGET_MS", "25"))
+DENSE_BUDGET_MS = float(os.getenv("VITALIS_DENSE_BUDGET_MS", "1500"))   # Then answer from BM25 alone
+# Lexical-only fast path: a clear BM25 winner (exact drug / protocol terms) skips the embedding
+FAST_PATH_SCORE = float(os.getenv("VITALIS_LEXICAL_FAST_PATH_SCORE", "12"))   # 0 disables
+FAST_PATH_MARGIN = float(os.getenv("VITALIS_LEXICAL_FAST_PATH_MARGIN", "1.5"))
 
 class KnowledgeService:
     def __init__(self):
-        # 1. Setup Vector DB (Persistent)
+        # 1. Setup Vector DB (Persistent) - loaded lazily, torch + Chroma take seconds to start
         self.db_dir = "knowledge_db"
-        self.embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.vector_store = Chroma(
+        self._store = container.register("knowledge", self._load_store)
+        # Each backend has its own catalog: switching re-indexes the library into the new store
+        catalog = "catalog.db" if VECTOR_STORE == "chroma" else f"catalog-{VECTOR_STORE}.db"
+        self.catalog = DocumentCatalog(os.path.join(self.db_dir, catalog))
+        self.lexical = LexicalIndex(os.path.join(self.db_dir, "lexical.db"))
+        self.pipeline = IngestPipeline(lambda: self.vector_store, self.catalog, self.lexical)
+        self.embedding_cache = MemoryLRU(QUERY_EMBEDDING_CACHE)
+        self.retrieval_cache = MemoryLRU(RETRIEVAL_CACHE)
+        self.dense_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dense")
+        self.routes = {"fused": 0, "fast_path": 0, "dense_timeout": 0, "vector": 0, "lexical": 0}
+        self._routes_lock = threading.Lock()
+
+    def _load_store(self):
+        embedding_function = load_embeddings(batch_size=EMBED_BATCH)
+        if VECTOR_STORE == "numpy":
+            vector_store = NumpyVectorStore(os.path.join(self.db_dir, "vectors"), embedding_function)
+            print(f"📚 Knowledge Base Loaded (numpy: {vector_store.stats()}).")
+            return vector_store
+
+        from langchain_chroma import Chroma
+        vector_store = Chroma(
             persist_directory=self.db_dir, 
-            embedding_function=self.embedding_function
+            embedding_function=embedding_function
         )
         print("📚 Knowledge Base Loaded.")
+        return vector_store
+
+    @property
+    def vector_store(self):
+        return self._store.get()
+
+    @property
+    def embedding_function(self):
+        return self.vector_store.embeddings
 
     def ingest_pdf(self, file_path):
-        print(f"📖 Reading {file_path}...")
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
-        
-        # Split into chunks (paragraphs)
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(docs)
-        
-        # Save to Vector DB
-        self.vector_store.add_documents(chunks)
-        print(f"✅ Indexed {len(chunks)} knowledge chunks.")
-        return len(chunks)
+        return self.ingest_pdfs([file_path])["chunks_indexed"]
+
+    def ingest_pdfs(self, paths, on_progress=None):
+        """Parallel parse + batched embed/write of many PDFs (blocking; run it as a job)."""
+        print(f"📖 Reading {len(paths)} PDF(s)...")
+        return self.pipeline.ingest(paths, on_progress)
+
+    def remove_document(self, filename: str) -> int:
+        """Deletes the document's vectors from the index. Returns how many were removed."""
+        removed = self.pipeline.remove(filename)
+        print(f"🗑️ Removed {removed} chunks of {filename} from the index.")
+        return removed
+
+    def documents(self):
+        """Catalog entries (chunk counts, page counts, ingest timings) per indexed document."""
+        return self.catalog.documents()
+
+    def sync_library(self, library_dir=LIBRARY_DIR, on_progress=None):
+        """Brings the index in line with library/: new/changed PDFs indexed, vanished ones removed."""
+        present = set(f for f in os.listdir(library_dir) if f.endswith(".pdf")) if os.path.isdir(library_dir) else set()
+        removed = {d["filename"]: self.remove_document(d["filename"]) for d in self.documents() if d["filename"] not in present}
+        result = self.ingest_pdfs([os.path.join(library_dir, f) for f in sorted(present)], on_progress)
+        return {**result, "removed": removed}
+
+    def shutdown(self):
+        self.pipeline.shutdown()
+        self.dense_executor.shutdown(wait=False, cancel_futures=True)
+
+    def embed_query(self, query: str):
+        embedding = self.embedding_cache.get(query)
+        if embedding is None:
+            embedding = self.embedding_function.embed_query(query)
+            self.embedding_cache.set(query, embedding)
+        return embedding
+
+    def retrieve(self, query: str, k: int = 3, mode: str = None):
+        """Top-k (text, metadata) for a query: BM25 and vector ranks fused (RRF) by default."""
+        mode = mode or RETRIEVAL_MODE
+        if mode == "vector":
+            self._route("vector")
+            return self._dense(query, k)
+
+        lexical = self._lexical(query)
+        if mode == "lexical":
+            self._route("lexical")
+            return [(content, metadata) for content, metadata, _ in lexical[:k]]
+        if self._confident(lexical):
+            self._route("fast_path")
+            return [(content, metadata) for content, metadata, _ in lexical[:k]]
+
+        dense = self.dense_executor.submit(self._dense, query, max(k, CANDIDATES))
+        try:
+            vector = dense.result(timeout=DENSE_BUDGET_MS / 1000 if lexical else None)
+        except FutureTimeout:
+            # The search keeps running (and lands in the cache) - this query makes do with BM25
+            print(f"⏱️ Vector search over {DENSE_BUDGET_MS:.0f}ms budget; answering from BM25.")
+            self._route("dense_timeout")
+            return [(content, metadata) for content, metadata, _ in lexical[:k]]
+        self._route("fused")
+        return self._fuse(lexical, vector)[:k]
+
+    def _dense(self, query: str, k: int):
+        """Vector top-k. Cached until the library changes (generation bump)."""
+        embedding = self.embed_query(query)
+        key = make_key([round(x, 6) for x in embedding], k, self.catalog.generation)
+        results = self.retrieval_cache.get(key)
+        if results is None:
+            docs = self.vector_store.similarity_search_by_vector(embedding, k=k)
+            results = [(doc.page_content, doc.metadata) for doc in docs]
+            self.retrieval_cache.set(key, results)
+        return results
+
+    def _lexical(self, query: str):
+        """BM25 candidates as (text, metadata, score), best first."""
+        hits = self.lexical.search(query, k=CANDIDATES, budget_ms=LEXICAL_BUDGET_MS)
+        chunks = self.lexical.get([chunk_id for chunk_id, _ in hits])
+        return [(*chunks[chunk_id], score) for chunk_id, score in hits if chunk_id in chunks]
+
+    def _confident(self, lexical) -> bool:
+        if not FAST_PATH_SCORE or not lexical or lexical[0][2] < FAST_PATH_SCORE:
+            return False
+        return len(lexical) < 2 or lexical[0][2] >= FAST_PATH_MARGIN * lexical[1][2]
+
+    def _fuse(self, *rankings):
+        # Reciprocal rank fusion, keyed on source + page + text so both lists agree on identity
+        scores, chunks = {}, {}
+        for ranking in rankings:
+            for rank, (content, metadata, *_) in enumerate(ranking):
+                key = text_sha256(os.path.basename(metadata.get("source", "")), metadata.get("page", 0), content)
+                scores[key] = scores.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+                chunks[key] = (content, metadata)
+        return [chunks[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+    def _route(self, name: str):
+        with self._routes_lock:
+            self.routes[name] += 1
 
     def search_knowledge(self, query):
         print(f"🔍 Searching library for: {query}")
         # Retrieve top 3 most relevant chunks
-        results = self.vector_store.similarity_search(query, k=3)
+        results = self.retrieve(query, k=3)
         
         context_text = ""
-        for doc in results:
-            source = os.path.basename(doc.metadata.get("source", "Unknown"))
-            page = doc.metadata.get("page", 0)
-            context_text += f"\n[SOURCE: {source}, Page {page}]: {doc.page_content}\n"
+        for content, metadata in results:
+            source = os.path.basename(metadata.get("source", "Unknown"))
+            page = metadata.get("page", 0)
+            context_text += f"\n[SOURCE: {source}, Page {page}]: {content}\n"
             
         return context_text
 
+    def stats(self):
+        return {
+            "generation": self.catalog.generation,
+            "query_embeddings": self.embedding_cache.stats(),
+            "retrievals": self.retrieval_cache.stats(),
+            "lexical": self.lexical.stats(),
+            "mode": RETRIEVAL_MODE,
+            "vector_store": VECTOR_STORE,
+            # The backend that actually loaded, not the configured one (ONNX falls back to torch)
+            "embeddings": embedding_label(self.embedding_function) if self._store.loaded else "not loaded",
+            "routes": dict(self.routes),
+        }
+
 knowledge_service = KnowledgeService()
\ No newline at end of file
@@ -1,7 +1,7 @@
-import ollama
-import json
+from app.services.llm import llm_gateway
 from datetime import datetime
-from langchain_community.document_loaders import PyPDFLoader
+from app.services.uploads import extract_pdf_text
+from app.services.structured import LabReport, StructuredOutputError
 
 class LabExtractor:
     def __init__(self, model="llama3.2"):
@@ -49,21 +49,25 @@ class LabExtractor:
                 continue
         return data
 
-    def extract_from_pdf(self, file_path: str):
+    def extract_from_pdf(self, source):
+        # `source` is a path or a file-like buffer straight from the upload
+        return list(self.stream_from_pdf(source))
+
+    def stream_from_pdf(self, source):
+        """Yields each lab row (dates + units normalized) as soon as the model finishes writing it."""
         print("🩸 Analyzing Lab Report...")
         
         try:
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
-            text_content = "\n".join([p.page_content for p in pages])
+            text_content = extract_pdf_text(source)
             
             # Check if PDF text is empty (Scanned PDF issue)
             if len(text_content.strip()) < 10:
                 print("⚠️ Warning: PDF extracted text is empty. It might be a scanned image.")
-                return []
+                return
                 
         except Exception as e:
-            return [{"test_name": "Error", "value": "0", "unit": "N/A", "status": str(e), "date": datetime.now().strftime("%Y-%m-%d")}]
+            yield {"test_name": "Error", "value": "0", "unit": "N/A", "status": str(e), "date": datetime.now().strftime("%Y-%m-%d")}
+            return
 
         prompt = f"""
         You are a Data Scraper. Your job is to COPY text from the document exactly.
@@ -76,71 +80,54 @@ class LabExtractor:
            - Extract the date EXACTLY as it appears.
            - If NO date is found, write "TODAY".
         2. Find the Lab Results Table.
-        3. Extract each row into a JSON object.
+        3. Extract each row into an object of "results".
         4. **CRITICAL:** Look for a column named "Flag", "Status", or "Reference". 
            - IF the document explicitly says "High", "Low", or "H", "L" -> Use that status.
            - IF the document says "Normal" or is blank -> Use "Normal".
         
-        OUTPUT FORMAT (Strict JSON Array):
-        [
+        OUTPUT FORMAT (JSON):
+        {{"results": [
             {{"test_name": "Test Name", "value": "Value", "unit": "Unit", "status": "Status", "date": "Raw Date String"}}
-        ]
+        ]}}
         """
 
-        response = ollama.chat(model=self.model, messages=[
+        messages = [
             {'role': 'system', 'content': 'You are a robotic data scraper. You output valid JSON only. Do not write Note or Explanation.'},
             {'role': 'user', 'content': prompt}
-        ])
-        
-        content = response['message']['content']
-        
+        ]
+
+        today_str = datetime.now().strftime("%Y-%m-%d")
         try:
-            # --- FIX: ROBUST JSON EXTRACTION ---
-            # Find the first '[' and the last ']' to ignore any "Here is the JSON" text
-            import re
-            json_match = re.search(r"\[.*\]", content, re.DOTALL)
-            
-            if json_match:
-                clean_json = json_match.group(0)
-            else:
-                print(f"❌ No JSON array found in LLM response: {content}")
-                return []
+            for kind, value in llm_gateway.stream_json(self.model, messages, LabReport):
+                if kind == "item" and value[0] == "results" and isinstance(value[1], dict):
+                    yield self._clean_row(value[1], today_str)
+        except StructuredOutputError as e:
+            # Rows already yielded stay valid; only the cut-off tail is lost
+            print(f"⚠️ Lab extraction incomplete: {e}")
 
-            data = json.loads(clean_json)
-            
-            # Date & Unit Logic (Keep existing)
-            today_str = datetime.now().strftime("%Y-%m-%d")
-            for item in data:
-                item['value'] = str(item.get('value', '0'))
-                raw_date = item.get('date', 'TODAY')
-                if raw_date.upper() == 'TODAY':
-                    item['date'] = today_str
-                else:
-                    try:
-                        parsed_date = None
-                        for fmt in ("%b %d, %Y", "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%B %d, %Y", "%d-%b-%Y"):
-                            try:
-                                parsed_date = datetime.strptime(raw_date, fmt)
-                                break
-                            except ValueError: continue
-                        if parsed_date: item['date'] = parsed_date.strftime("%Y-%m-%d")
-                        else: item['date'] = today_str
-                    except: item['date'] = today_str
-            
-            # Apply Unit Normalization
-            data = self.normalize_units(data)
-            return data
+    def _clean_row(self, item, today_str):
+        # Date & Unit Logic
+        item['value'] = str(item.get('value', '0'))
+        raw_date = str(item.get('date', 'TODAY'))
+        if raw_date.upper() == 'TODAY':
+            item['date'] = today_str
+        else:
+            parsed_date = None
+            for fmt in ("%b %d, %Y", "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%B %d, %Y", "%d-%b-%Y"):
+                try:
+                    parsed_date = datetime.strptime(raw_date, fmt)
+                    break
+                except ValueError: continue
+            item['date'] = parsed_date.strftime("%Y-%m-%d") if parsed_date else today_str
 
-        except Exception as e:
-            print(f"❌ JSON Parse Error: {e}")
-            print(f"⚠️ Raw Output from AI: {content}") # Inspect this in terminal to see what went wrong
-            return []
+        # Apply Unit Normalization
+        return self.normalize_units([item])[0]
 
     def analyze_trend(self, test_name, history_data):
         print(f"📈 Analyzing trend for {test_name}...")
         data_str = "\n".join([f"{d['date']}: {d['value']}" for d in history_data])
         prompt = f"""You are a Medical Trend Analyst. TEST: {test_name}. DATA: {data_str}. TASK: Write 2 sentences on the trajectory. Is it improving or worsening?"""
-        response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+        response = llm_gateway.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
         return response['message']['content']
 
 lab_service = LabExtractor()
\ No newline at end of file
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import math
+import time
+import uuid
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Configuration
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps identifiers whole ("tmp-smx", "icd-10", "5.2") and also indexes their parts
+TOKEN = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+STOPWORDS = set("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+if then than not no do does did can may should must patient patients
+""".split())
+
+def tokenize(text: str):
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if any(c in token for c in "-/."):
+            tokens.extend(p for p in re.split(r"[-/.]", token) if p and p not in STOPWORDS)
+    return tokens
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the knowledge chunks. Persisted in SQLite (updated incrementally
+    alongside the vector store) and served from memory; a version row tells each process when
+    another one changed the index, and the postings are reloaded. Search can be given a time
+    budget: terms are scored rarest first and the rest are skipped once the budget is spent.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_postings_id ON postings(id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+        self._version = None
+        self.postings = {}   # term -> {chunk id: term frequency}
+        self.lengths = {}    # chunk id -> tokens
+        self.total_length = 0
+
+    def _current_version(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else "0"
+
+    def _refresh(self):
+        """Reloads the postings if any process changed the index since we last looked."""
+        with self._lock:
+            version = self._current_version()
+            if version == self._version:
+                return
+            started = time.perf_counter()
+            postings, lengths = {}, {}
+            for chunk_id, length in self._conn.execute("SELECT id, length FROM chunks"):
+                lengths[chunk_id] = length
+            for term, chunk_id, tf in self._conn.execute("SELECT term, id, tf FROM postings"):
+                postings.setdefault(term, {})[chunk_id] = tf
+            self.postings, self.lengths, self.total_length = postings, lengths, sum(lengths.values())
+            self._version = version
+            print(f"🔤 Lexical index loaded: {len(self.lengths)} chunks, {len(self.postings)} terms in {time.perf_counter() - started:.2f}s")
+
+    @contextmanager
+    def _writing(self):
+        """
+        One write transaction. BEGIN IMMEDIATE takes the SQLite write lock before we refresh, so no
+        other process can change the index between our reload and our commit.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                self._version = uuid.uuid4().hex
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (self._version,))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                self._version = None  # Memory may be ahead of the database: reload on next use
+                raise
+
+    # --- UPDATES ---
+    def add(self, chunks):
+        """Upserts [{"id", "text", "metadata"}]."""
+        with self._writing():
+            self._remove([c["id"] for c in chunks if c["id"] in self.lengths])
+            rows, postings = [], []
+            for chunk in chunks:
+                counts = Counter(tokenize(chunk["text"]))
+                length = sum(counts.values())
+                rows.append((chunk["id"], chunk["text"], json.dumps(chunk["metadata"]), length))
+                self.lengths[chunk["id"]] = length
+                self.total_length += length
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[chunk["id"]] = tf
+                    postings.append((term, chunk["id"], tf))
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (id, text, metadata, length) VALUES (?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT OR REPLACE INTO postings (term, id, tf) VALUES (?, ?, ?)", postings)
+
+    def remove(self, ids):
+        with self._writing():
+            self._remove(list(ids))
+
+    def _remove(self, ids):
+        if not ids:
+            return
+        for chunk_id in ids:
+            terms = [r[0] for r in self._conn.execute("SELECT term FROM postings WHERE id = ?", (chunk_id,))]
+            for term in terms:
+                docs = self.postings.get(term)
+                if docs is not None:
+                    docs.pop(chunk_id, None)
+                    if not docs:
+                        del self.postings[term]
+            self.total_length -= self.lengths.pop(chunk_id, 0)
+        self._conn.executemany("DELETE FROM postings WHERE id = ?", [(i,) for i in ids])
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+
+    # --- QUERIES ---
+    def search(self, query: str, k: int = 10, budget_ms: float = None):
+        """[(chunk id, score)] best first. Returns partial (rarest-terms) scores if the budget runs out."""
+        self._refresh()
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+        with self._lock:
+            n = len(self.lengths)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            terms = [t for t in set(tokenize(query)) if t in self.postings]
+            terms.sort(key=lambda t: len(self.postings[t]))  # Rarest (most informative) first
+            scores = {}
+            for i, term in enumerate(terms):
+                if i and deadline and time.perf_counter() > deadline:
+                    break  # Always score at least the rarest term
+                docs = self.postings[term]
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for chunk_id, tf in docs.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def get(self, ids):
+        """{chunk id: (text, metadata)}"""
+        if not ids:
+            return {}
+        with self._lock:
+            marks = ",".join("?" * len(ids))
+            rows = self._conn.execute(f"SELECT id, text, metadata FROM chunks WHERE id IN ({marks})", list(ids)).fetchall()
+        return {r[0]: (r[1], json.loads(r[2])) for r in rows}
+
+    def ids(self):
+        self._refresh()
+        with self._lock:
+            return set(self.lengths)
+
+    def stats(self):
+        self._refresh()
+        with self._lock:
+            return {"chunks": len(self.lengths), "terms": len(self.postings)}
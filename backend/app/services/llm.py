@@ -0,0 +1,300 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import httpx
+import ollama
+from contextlib import contextmanager
+from app.services.scheduler import model_scheduler, current_priority
+from app.services.cache import DiskCache, make_key
+from app.services.residency import residency_manager
+from app.services.structured import IncrementalJSONParser, StructuredOutputError
+
+# Configuration
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+REQUEST_TIMEOUT = float(os.getenv("VITALIS_LLM_TIMEOUT", "180"))  # Seconds (CPU generations are slow)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5       # 0.5s, 1s, 2s (+ jitter)
+POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+# Response cache (opt-in per call: only for prompts where a repeat answer is acceptable)
+RESPONSE_CACHE_BYTES = int(os.getenv("VITALIS_LLM_CACHE_MB", "128")) * 1024 * 1024
+RESPONSE_CACHE_TTL = int(os.getenv("VITALIS_LLM_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds
+
+def _field(response, name):
+    # Ollama responses are pydantic models; missing counters just mean "not reported"
+    return getattr(response, name, None)
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return True
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500 or error.status_code == 429
+    return False
+
+class ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.load_seconds = 0.0
+        self.generation_seconds = 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_seconds": round(self.latency_seconds / self.calls, 3) if self.calls else None,
+            "max_latency_seconds": round(self.max_latency_seconds, 3),
+            "model_load_seconds": round(self.load_seconds, 3),
+            "tokens_per_second": round(self.completion_tokens / self.generation_seconds, 1) if self.generation_seconds else None,
+        }
+
+class LLMGateway:
+    """
+    Single entry point for every Ollama call: pooled HTTP connections (sync + async),
+    per-model concurrency slots (shared with the job priorities), timeouts, retry with
+    backoff, streaming, and token/latency accounting.
+    """
+    def __init__(self, host: str = OLLAMA_HOST):
+        self.host = host
+        self.client = ollama.Client(host=host, timeout=REQUEST_TIMEOUT, limits=POOL_LIMITS)
+        self._async_client = None
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.cache = DiskCache("llm_responses", RESPONSE_CACHE_BYTES, ttl_seconds=RESPONSE_CACHE_TTL)
+
+    @property
+    def async_client(self):
+        # Created inside the running event loop on first use
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient(host=self.host, timeout=REQUEST_TIMEOUT, limits=POOL_LIMITS)
+        return self._async_client
+
+    # --- RESPONSE CACHE ---
+    def _cache_key(self, model: str, messages, template_version: str, kwargs):
+        # Keyed by everything that shapes the answer; bump template_version when a prompt changes
+        return make_key(model, messages, kwargs.get("options"), kwargs.get("format"), template_version)
+
+    def _cached(self, key):
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        print("🧮 LLM cache hit.")
+        return ollama.ChatResponse.model_validate(cached)
+
+    def _store(self, key, response):
+        self.cache.set(key, response.model_dump(mode="json"))
+
+    # --- RESIDENCY + CONCURRENCY ---
+    def _acquire(self, model: str, priority: int):
+        # Model group first (avoids swapping llava <-> llama3.2), then the per-model slot
+        residency_manager.gate.acquire(model)
+        try:
+            model_scheduler.slots_for(model).acquire(priority)
+        except BaseException:
+            residency_manager.gate.release(model)
+            raise
+
+    def _release(self, model: str):
+        model_scheduler.slots_for(model).release()
+        residency_manager.gate.release(model)
+
+    @contextmanager
+    def _hold(self, model: str):
+        self._acquire(model, current_priority.get())
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    # --- SYNC API (agents run on worker threads) ---
+    def chat(self, model: str, messages, stream: bool = False, cache_version: str = None, **kwargs):
+        """
+        Drop-in for ollama.chat(). With stream=True returns a generator of chunks.
+        Pass cache_version (the prompt template version) to serve repeats from the response cache.
+        """
+        if stream:
+            return self._stream(model, messages, cache_version, **kwargs)
+
+        key = None
+        if cache_version:
+            key = self._cache_key(model, messages, cache_version, kwargs)
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+
+        response = self._chat(model, messages, **kwargs)
+        if key:
+            self._store(key, response)
+        return response
+
+    def _chat(self, model: str, messages, **kwargs):
+        kwargs.setdefault("keep_alive", residency_manager.keep_alive(model))
+        with self._hold(model):
+            started = time.perf_counter()
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    response = self.client.chat(model=model, messages=messages, **kwargs)
+                    self._account(model, response, time.perf_counter() - started, attempt)
+                    return response
+                except Exception as e:
+                    if attempt == MAX_RETRIES or not _retryable(e):
+                        self._error(model, attempt)
+                        raise
+                    time.sleep(self._backoff(attempt))
+
+    def _stream(self, model: str, messages, cache_version: str = None, **kwargs):
+        key = None
+        if cache_version:
+            key = self._cache_key(model, messages, cache_version, kwargs)
+            cached = self._cached(key)
+            if cached is not None:
+                yield cached  # Whole answer as a single, final chunk
+                return
+
+        content = ""
+        for chunk in self._stream_uncached(model, messages, **kwargs):
+            content += chunk["message"]["content"]
+            if key and _field(chunk, "done"):
+                final = chunk.model_copy(deep=True)
+                final.message.content = content
+                self._store(key, final)
+            yield chunk
+
+    def _stream_uncached(self, model: str, messages, **kwargs):
+        kwargs.setdefault("keep_alive", residency_manager.keep_alive(model))
+        with self._hold(model):
+            started = time.perf_counter()
+            for attempt in range(MAX_RETRIES + 1):
+                produced = False
+                try:
+                    for chunk in self.client.chat(model=model, messages=messages, stream=True, **kwargs):
+                        produced = True
+                        if _field(chunk, "done"):
+                            self._account(model, chunk, time.perf_counter() - started, attempt)
+                        yield chunk
+                    return
+                except Exception as e:
+                    # Only retry if nothing reached the caller yet
+                    if produced or attempt == MAX_RETRIES or not _retryable(e):
+                        self._error(model, attempt)
+                        raise
+                    time.sleep(self._backoff(attempt))
+
+    # --- STRUCTURED OUTPUT (JSON schema passed as `format`, result validated with pydantic) ---
+    def chat_json(self, model: str, messages, schema, **kwargs):
+        """Returns a validated `schema` instance; Ollama constrains generation to the schema."""
+        response = self.chat(model, messages, format=schema.model_json_schema(), **kwargs)
+        return self._validate(schema, response['message']['content'])
+
+    def stream_json(self, model: str, messages, schema, **kwargs):
+        """
+        Yields ("token", text) as it is generated, ("field", (key, value)) / ("item", (key, value))
+        as soon as a top-level field or array element is complete, then ("result", instance).
+        """
+        parser = IncrementalJSONParser()
+        content = ""
+        for chunk in self.chat(model, messages, stream=True, format=schema.model_json_schema(), **kwargs):
+            token = chunk['message']['content']
+            content += token
+            yield "token", token
+            yield from parser.feed(token)
+        yield "result", self._validate(schema, content)
+
+    async def achat_json(self, model: str, messages, schema, **kwargs):
+        response = await self.achat(model, messages, format=schema.model_json_schema(), **kwargs)
+        return self._validate(schema, response['message']['content'])
+
+    def _validate(self, schema, content: str):
+        try:
+            return schema.model_validate_json(content)
+        except ValueError as e:
+            # Only reachable if generation was cut short (timeout / num_predict)
+            raise StructuredOutputError(f"{schema.__name__}: {e}") from e
+
+    # --- ASYNC API (for endpoints that talk to Ollama directly) ---
+    async def achat(self, model: str, messages, cache_version: str = None, **kwargs):
+        key = None
+        if cache_version:
+            key = self._cache_key(model, messages, cache_version, kwargs)
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+
+        response = await self._achat(model, messages, **kwargs)
+        if key:
+            self._store(key, response)
+        return response
+
+    async def _achat(self, model: str, messages, **kwargs):
+        kwargs.setdefault("keep_alive", residency_manager.keep_alive(model))
+        loop = asyncio.get_running_loop()
+        # Waiting for a slot blocks, so do it off the event loop
+        acquire = loop.run_in_executor(None, self._acquire, model, current_priority.get())
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # Caller went away while queued: hand the slot back as soon as we get it
+            acquire.add_done_callback(lambda f: f.exception() is None and self._release(model))
+            raise
+        try:
+            started = time.perf_counter()
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    response = await self.async_client.chat(model=model, messages=messages, **kwargs)
+                    self._account(model, response, time.perf_counter() - started, attempt)
+                    return response
+                except Exception as e:
+                    if attempt == MAX_RETRIES or not _retryable(e):
+                        self._error(model, attempt)
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+        finally:
+            self._release(model)
+
+    # --- ACCOUNTING ---
+    def _backoff(self, attempt: int) -> float:
+        return BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+
+    def _model_stats(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats()
+        return self._stats[model]
+
+    def _account(self, model: str, response, latency: float, retries: int):
+        with self._lock:
+            s = self._model_stats(model)
+            s.calls += 1
+            s.retries += retries
+            s.prompt_tokens += _field(response, "prompt_eval_count") or 0
+            s.completion_tokens += _field(response, "eval_count") or 0
+            s.latency_seconds += latency
+            s.max_latency_seconds = max(s.max_latency_seconds, latency)
+            load_seconds = (_field(response, "load_duration") or 0) / 1e9
+            s.load_seconds += load_seconds
+            s.generation_seconds += (_field(response, "eval_duration") or 0) / 1e9
+        residency_manager.observe(model, load_seconds)
+        print(f"🧮 {model}: {_field(response, 'prompt_eval_count')} prompt + "
+              f"{_field(response, 'eval_count')} completion tokens in {latency:.1f}s")
+
+    def _error(self, model: str, retries: int):
+        with self._lock:
+            s = self._model_stats(model)
+            s.errors += 1
+            s.retries += retries
+
+    def stats(self):
+        with self._lock:
+            models = {model: s.to_dict() for model, s in self._stats.items()}
+        return {"models": models, "response_cache": self.cache.stats()}
+
+llm_gateway = LLMGateway()
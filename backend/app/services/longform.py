@@ -0,0 +1,124 @@
+import os
+import multiprocessing
+import threading
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+
+# NOTE: This module is imported by the worker processes, so it must stay free of the
+# service singletons (importing hearing.py there would load the whole replica pool).
+
+# Configuration
+SAMPLE_RATE = 16000
+LONG_AUDIO_SECONDS = int(os.getenv("VITALIS_LONG_AUDIO_SECONDS", "300"))  # Above this, use long-audio mode
+CHUNK_SECONDS = 120          # Target amount of speech per chunk (split only between speech regions)
+GAP_SECONDS = 0.3            # Silence kept between stitched speech regions inside a chunk
+THREADS_PER_PROCESS = int(os.getenv("VITALIS_WHISPER_THREADS", "4"))
+PROCESSES = int(os.getenv("VITALIS_LONG_AUDIO_PROCESSES", str(max(1, (os.cpu_count() or 4) // THREADS_PER_PROCESS))))
+
+@dataclass
+class StitchedSegment:
+    start: float
+    end: float
+    text: str
+
+class SpeechChunk:
+    """Speech-only audio plus the map back to the original recording's timeline."""
+    def __init__(self):
+        self.pieces = []        # (chunk_offset_s, original_start_s, length_s)
+        self.parts = []
+        self.samples = 0
+
+    def add(self, audio: np.ndarray, start: int, end: int):
+        if self.parts:
+            gap = np.zeros(int(GAP_SECONDS * SAMPLE_RATE), dtype=np.float32)
+            self.parts.append(gap)
+            self.samples += len(gap)
+        self.pieces.append((self.samples / SAMPLE_RATE, start / SAMPLE_RATE, (end - start) / SAMPLE_RATE))
+        self.parts.append(audio[start:end])
+        self.samples += end - start
+
+    @property
+    def seconds(self):
+        return self.samples / SAMPLE_RATE
+
+    def audio(self) -> np.ndarray:
+        return np.concatenate(self.parts)
+
+    def to_original(self, t: float) -> float:
+        idx = max(0, bisect_right([p[0] for p in self.pieces], t) - 1)
+        offset, original_start, length = self.pieces[idx]
+        return original_start + min(max(t - offset, 0.0), length)
+
+def split_speech(audio: np.ndarray, max_chunk_seconds: float = CHUNK_SECONDS):
+    """Drops silence with Silero VAD and groups speech regions into chunks of ~max_chunk_seconds."""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    # Long monologues without pauses are still cut (at the quietest point VAD can find)
+    regions = get_speech_timestamps(audio, VadOptions(max_speech_duration_s=max_chunk_seconds))
+    chunks, current = [], SpeechChunk()
+    for region in regions:
+        length = (region["end"] - region["start"]) / SAMPLE_RATE
+        if current.parts and current.seconds + length > max_chunk_seconds:
+            chunks.append(current)
+            current = SpeechChunk()
+        current.add(audio, region["start"], region["end"])
+    if current.parts:
+        chunks.append(current)
+    return chunks
+
+# --- WORKER PROCESS SIDE ---
+_worker_model = None
+
+def _init_worker(model_size, device, compute_type, threads):
+    global _worker_model
+    from faster_whisper import WhisperModel
+    _worker_model = WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=threads)
+
+def _transcribe_chunk(audio: np.ndarray, beam_size: int):
+    segments, info = _worker_model.transcribe(audio, beam_size=beam_size)
+    return [(s.start, s.end, s.text) for s in segments]
+
+# --- PARENT SIDE ---
+class LongformTranscriber:
+    """
+    Long-audio mode: decode once, trim silence, split at speech boundaries and transcribe
+    the chunks in parallel worker processes. Segments come back on the original timeline.
+    """
+    def __init__(self, model_size: str, device: str, compute_type: str, processes: int = PROCESSES):
+        self.processes = processes
+        self._config = (model_size, device, compute_type, THREADS_PER_PROCESS)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Started on first use: most consultations never need it
+        with self._lock:
+            if self._executor is None:
+                print(f"🎧 Starting {self.processes} long-audio Whisper workers...")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=self._config,
+                )
+            return self._executor
+
+    def stream(self, audio: np.ndarray, beam_size: int):
+        """Yields StitchedSegments in order; chunks decode in parallel meanwhile."""
+        chunks = split_speech(audio)
+        print(f"🎧 Long audio: {len(audio) / SAMPLE_RATE:.0f}s -> {len(chunks)} speech chunks "
+              f"({sum(c.seconds for c in chunks):.0f}s of speech)")
+        futures = [self.executor.submit(_transcribe_chunk, chunk.audio(), beam_size) for chunk in chunks]
+        try:
+            for chunk, future in zip(chunks, futures):
+                for start, end, text in future.result():
+                    yield StitchedSegment(chunk.to_original(start), chunk.to_original(end), text)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
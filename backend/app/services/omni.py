@@ -1,18 +1,23 @@
-import ollama
+from app.services.llm import llm_gateway
 import re
-import json
+from app.services.structured import DataEntry, PatientDraft
 from app.services.registry import registry_service
 from app.services.knowledge import knowledge_service
+from app.services.prompts import PromptBudget, Section
 
 class OmniService:
     def __init__(self, model="llama3.2"):
         self.model = model
         self.history = [] 
+        self.budget = PromptBudget(model)
 
     def _run_prompt(self, prompt):
-        res = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+        res = llm_gateway.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
         return res['message']['content'].strip()
 
+    def _run_json(self, prompt, schema):
+        return llm_gateway.chat_json(self.model, [{'role': 'user', 'content': prompt}], schema)
+
     def chat(self, user_query: str, use_memory: bool = True):
         print(f"🤖 Omni received: {user_query}")
 
@@ -65,7 +70,7 @@ class OmniService:
             if key in q: target_page = val; break
         
         # 2. SMART PATIENT MATCHING (The Fix)
-        patients = registry_service.get_all_patients()
+        patients, _ = registry_service.list_patients(fields=("id", "name"))
         target_patient_id = None
         target_patient_name = ""
         
@@ -118,10 +123,9 @@ class OmniService:
         OUTPUT JSON: {{"field": "...", "text": "..."}}
         """
         try:
-            json_str = self._run_prompt(prompt).replace("```json", "").replace("```", "").strip()
-            data = json.loads(json_str)
-            return f"<<UPDATE_FIELD:{data['field']}|{data['text']}>> Added to {data['field']}."
-        except:
+            data = self._run_json(prompt, DataEntry)
+            return f"<<UPDATE_FIELD:{data.field}|{data.text}>> Added to {data.field}."
+        except Exception:
             return "I couldn't parse that data entry request."
 
     def _handle_action(self, query):
@@ -129,17 +133,24 @@ class OmniService:
             # (Keep existing create logic)
             prompt = f"""Extract JSON: "{query}". Format: {{"name": "X", "age": 0, "history": "Y"}}"""
             try:
-                data = json.loads(self._run_prompt(prompt).replace("```json", "").replace("```", "").strip())
-                new_p = registry_service.create_patient(data.get('name','?'), int(data.get('age',0)), data.get('history',''))
+                data = self._run_json(prompt, PatientDraft)
+                new_p = registry_service.create_patient(data.name, data.age, data.history)
                 return f"✅ Created patient {new_p.name}."
-            except: return "Failed to create patient. Try 'Create patient X, age Y'."
+            except Exception: return "Failed to create patient. Try 'Create patient X, age Y'."
         return "I can only create patients right now."
 
     # (Keep _handle_data_query, _handle_knowledge_query, _simple_chat as is)
     def _handle_data_query(self, query):
-        patients = registry_service.get_all_patients()
+        patients, _ = registry_service.list_patients(fields=("id", "name", "age"))
         db_context = "\n".join([f"{p.id}: {p.name}, {p.age}y" for p in patients])
-        return self._run_prompt(f"Data Query. DB: {db_context}. User: {query}")
+        # Big registries: rows that mention a word from the question go in first
+        words = [re.escape(w) for w in re.findall(r"\w{3,}", query)]
+        priority = re.compile("|".join(words), re.I) if words else None
+        fitted = self.budget.fit(
+            "Omni data query", f"Data Query. DB: . User: {query}",
+            registry=Section(db_context, keep="salient", priority=priority, separator="\n"),
+        )
+        return self._run_prompt(f"Data Query. DB: {fitted['registry']}. User: {query}")
 
     def _handle_knowledge_query(self, query):
         return self._run_prompt(f"Medical Knowledge. User: {query}")
@@ -20,12 +20,13 @@ class PassportService:
 
     # --- GENERATE PAYLOAD (Common logic) ---
     def _create_encrypted_blob(self, patient_id, password, hours_valid):
-        patient = registry_service.get_patient(patient_id)
-        if not patient: return None, None
+        with registry_service.session() as db:
+            patient = registry_service.get_patient(patient_id, db, with_records=True)
+            if not patient: return None, None
 
-        consults = [{"date": c.timestamp.strftime("%Y-%m-%d %H:%M:%S"), "soap": c.soap_note, "safety": c.safety_analysis} for c in patient.consultations]
-        raw_labs = registry_service.get_patient_labs(patient_id)
-        labs = [{"date": l.date.strftime("%Y-%m-%d"), "test": l.test_name, "val": l.value, "unit": l.unit, "status": l.status} for l in raw_labs]
+            consults = [{"date": c.timestamp.strftime("%Y-%m-%d %H:%M:%S"), "soap": c.soap_note, "safety": c.safety_analysis} for c in patient.consultations]
+            raw_labs = sorted(patient.lab_results, key=lambda l: l.date or datetime.min)
+            labs = [{"date": l.date.strftime("%Y-%m-%d"), "test": l.test_name, "val": l.value, "unit": l.unit, "status": l.status} for l in raw_labs]
 
         if hours_valid == -1: expiry_str = (datetime.now() + timedelta(days=36500)).isoformat()
         else: expiry_str = (datetime.now() + timedelta(hours=hours_valid)).isoformat()
@@ -59,14 +60,10 @@ class PassportService:
         return path
 
     # --- EXPORT STEALTH (STEGANOGRAPHY) ---
-    def generate_stealth_passport(self, patient_id: int, password: str, image_path: str, hours_valid: int = 24) -> str:
+    def generate_stealth_passport(self, patient_id: int, password: str, image_data: bytes, hours_valid: int = 24) -> str:
         blob, name = self._create_encrypted_blob(patient_id, password, hours_valid)
         if not blob: return None
 
-        # Read the Carrier Image
-        with open(image_path, "rb") as img:
-            image_data = img.read()
-
         # Combine: [Image Bytes] + [Signature] + [Encrypted Blob]
         stego_data = image_data + VITALIS_SIG + blob
         
@@ -79,11 +76,8 @@ class PassportService:
         return output_path
 
     # --- IMPORT (Smart Detection) ---
-    def import_passport(self, file_path: str, password: str):
+    def import_passport(self, file_content: bytes, password: str):
         try:
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-            
             # CHECK FOR STEGANOGRAPHY
             if VITALIS_SIG in file_content:
                 # Split at the signature. Take the part AFTER the signature.
@@ -113,18 +107,19 @@ class PassportService:
                 if datetime.now() > expiry_dt:
                     return {"error": "PASSPORT EXPIRED. Access Denied."}
 
-            # Merge to DB
+            # Merge to DB (one pooled session for the whole merge)
             p_data = data["profile"]
-            new_p = registry_service.create_patient(f"{p_data['name']} (Imported)", p_data['age'], p_data['history'])
-            
-            for c in data.get("consultations", []):
-                registry_service.save_consultation(new_p.id, c['soap'], c['safety'])
-                
-            restored_labs = []
-            for l in data.get("labs", []):
-                restored_labs.append({"test_name": l["test"], "value": l["val"], "unit": l["unit"], "status": l["status"], "date": l["date"]})
-            if restored_labs:
-                registry_service.save_lab_results(new_p.id, restored_labs)
+            with registry_service.session(write=True) as db:
+                new_p = registry_service.create_patient(f"{p_data['name']} (Imported)", p_data['age'], p_data['history'], db)
+
+                for c in data.get("consultations", []):
+                    registry_service.save_consultation(new_p.id, c['soap'], c['safety'], db)
+
+                restored_labs = []
+                for l in data.get("labs", []):
+                    restored_labs.append({"test_name": l["test"], "value": l["val"], "unit": l["unit"], "status": l["status"], "date": l["date"]})
+                if restored_labs:
+                    registry_service.save_lab_results(new_p.id, restored_labs, db)
                 
             return {"status": "success", "name": new_p.name}
             
@@ -133,11 +128,8 @@ class PassportService:
             return {"error": "Decryption Failed or Invalid File"}
 
         # --- PEEK / PREVIEW (No Database Write) ---
-    def preview_passport(self, file_path: str, password: str):
+    def preview_passport(self, file_content: bytes, password: str):
         try:
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-            
             # 1. Check for Stealth Signature
             if VITALIS_SIG in file_content:
                 parts = file_content.split(VITALIS_SIG)
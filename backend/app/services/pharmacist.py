@@ -1,21 +1,57 @@
-import ollama
+from app.services.llm import llm_gateway
+from app.services.pharmacology import pharmacology_engine, ALLERGY_CUE
+from app.services.prompts import PromptBudget, Section
 
 class PharmacistAgent:
     def __init__(self, model="llama3.2"):
         self.model = model
+        self.engine = pharmacology_engine
+        self.decisions = {"rules": 0, "llm": 0}
+        self.budget = PromptBudget(model)
 
     def check_safety(self, soap_note: str, patient_history: str):
         # Sanity Check
         if "Clinical Review Required" in soap_note or len(soap_note) < 20:
              return "SAFE: No plan generated yet."
 
-        print("💊 Pharmacist Agent is reviewing the plan...")
+        # Lexicon + allergy/interaction tables settle almost every case without a model call
+        verdict = self.engine.review(soap_note, patient_history)
+        if verdict.status != "AMBIGUOUS":
+            self.decisions["rules"] += 1
+            return verdict.text
+
+        self.decisions["llm"] += 1
+        print(f"💊 Pharmacist Agent is reviewing the plan ({'; '.join(verdict.reasons)})...")
+        known = ", ".join(verdict.prescribed) or "none recognized"
+        unresolved = "; ".join(verdict.reasons)
+
+        # Long histories: allergy sentences first, then whatever else fits. The plan sits at the end of the note.
+        fitted = self.budget.fit(
+            "Pharmacist", self._prompt("", "", known, unresolved),
+            history=Section(patient_history, weight=3, keep="salient", priority=ALLERGY_CUE),
+            plan=Section(soap_note, weight=2, keep="tail"),
+        )
+        prompt = self._prompt(fitted["history"], fitted["plan"], known, unresolved)
+
+        response = llm_gateway.chat(model=self.model, messages=[
+            {'role': 'user', 'content': prompt},
+        ])
         
-        prompt = f"""
+        raw = response['message']['content'].strip()
+        
+        # Cleanup
+        if "WARNING" in raw.upper():
+            return "WARNING:" + raw.split("WARNING")[1].split(".")[0].lstrip(":").strip() + "."
+        return "SAFE: No critical risks detected."
+
+    def _prompt(self, patient_history: str, soap_note: str, known: str, unresolved: str):
+        return f"""
         You are a Toxicology Safety Engine.
         
         PATIENT HISTORY: "{patient_history}"
         PROPOSED PLAN: "{soap_note}"
+        ALREADY CHECKED (no conflicts): {known}
+        UNRESOLVED: {unresolved}
 
         TASK:
         1. List all medications found in the "PROPOSED PLAN".
@@ -33,15 +69,7 @@ class PharmacistAgent:
         SAFE: [Reason]
         """
 
-        response = ollama.chat(model=self.model, messages=[
-            {'role': 'user', 'content': prompt},
-        ])
-        
-        raw = response['message']['content'].strip()
-        
-        # Cleanup
-        if "WARNING" in raw.upper():
-            return "WARNING:" + raw.split("WARNING")[1].split(".")[0].lstrip(":").strip() + "."
-        return "SAFE: No critical risks detected."
+    def stats(self):
+        return dict(self.decisions)
 
 pharmacist_service = PharmacistAgent()
\ No newline at end of file
@@ -0,0 +1,385 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+
+# --- LEXICON ---
+# generic name -> (drug class, synonyms / brand names). All terms are matched case-insensitively on word boundaries.
+DRUGS = {
+    # Beta-lactams
+    "penicillin": ("penicillin", ["penicillin v", "penicillin g", "pen vk", "bicillin"]),
+    "amoxicillin": ("penicillin", ["amoxil", "amoxycillin"]),
+    "amoxicillin-clavulanate": ("penicillin", ["augmentin", "co-amoxiclav", "amoxicillin clavulanate", "amoxicillin/clavulanate"]),
+    "ampicillin": ("penicillin", ["principen"]),
+    "ampicillin-sulbactam": ("penicillin", ["unasyn"]),
+    "piperacillin-tazobactam": ("penicillin", ["zosyn", "tazocin", "pip-tazo", "piperacillin"]),
+    "flucloxacillin": ("penicillin", ["floxapen"]),
+    "dicloxacillin": ("penicillin", []),
+    "cephalexin": ("cephalosporin", ["keflex", "cefalexin"]),
+    "cefazolin": ("cephalosporin", ["ancef", "kefzol"]),
+    "ceftriaxone": ("cephalosporin", ["rocephin"]),
+    "cefuroxime": ("cephalosporin", ["zinacef", "ceftin"]),
+    "cefepime": ("cephalosporin", ["maxipime"]),
+    "meropenem": ("carbapenem", ["merrem"]),
+    "imipenem": ("carbapenem", ["primaxin", "imipenem-cilastatin"]),
+    # Other antibiotics
+    "vancomycin": ("glycopeptide", ["vancocin", "vanc"]),
+    "azithromycin": ("macrolide", ["zithromax", "z-pak", "zpak"]),
+    "clarithromycin": ("macrolide", ["biaxin", "klacid"]),
+    "erythromycin": ("macrolide", ["ery-tab", "erythrocin"]),
+    "ciprofloxacin": ("fluoroquinolone", ["cipro"]),
+    "levofloxacin": ("fluoroquinolone", ["levaquin"]),
+    "moxifloxacin": ("fluoroquinolone", ["avelox"]),
+    "doxycycline": ("tetracycline", ["vibramycin", "doryx"]),
+    "sulfamethoxazole-trimethoprim": ("sulfonamide_antibiotic", ["bactrim", "septra", "co-trimoxazole", "tmp-smx", "smx-tmp", "sulfamethoxazole"]),
+    "trimethoprim": ("antifolate", []),
+    "nitrofurantoin": ("nitrofuran", ["macrobid", "macrodantin"]),
+    "metronidazole": ("nitroimidazole", ["flagyl"]),
+    "clindamycin": ("lincosamide", ["cleocin"]),
+    "gentamicin": ("aminoglycoside", ["garamycin"]),
+    # Analgesics
+    "aspirin": ("salicylate", ["acetylsalicylic acid", "asa", "ecotrin", "disprin"]),
+    "ibuprofen": ("nsaid", ["advil", "motrin", "nurofen"]),
+    "naproxen": ("nsaid", ["aleve", "naprosyn"]),
+    "diclofenac": ("nsaid", ["voltaren", "cataflam"]),
+    "ketorolac": ("nsaid", ["toradol"]),
+    "celecoxib": ("nsaid", ["celebrex"]),
+    "indomethacin": ("nsaid", ["indocin"]),
+    "acetaminophen": ("analgesic", ["paracetamol", "tylenol", "panadol"]),
+    "morphine": ("opioid", ["ms contin", "oramorph"]),
+    "codeine": ("opioid", []),
+    "hydromorphone": ("opioid", ["dilaudid"]),
+    "oxycodone": ("opioid", ["oxycontin", "percocet", "roxicodone"]),
+    "hydrocodone": ("opioid", ["vicodin", "norco"]),
+    "fentanyl": ("opioid", ["duragesic", "sublimaze"]),
+    "tramadol": ("opioid", ["ultram"]),
+    # Cardiovascular
+    "warfarin": ("anticoagulant", ["coumadin", "jantoven"]),
+    "heparin": ("anticoagulant", ["unfractionated heparin"]),
+    "enoxaparin": ("anticoagulant", ["lovenox", "clexane"]),
+    "apixaban": ("anticoagulant", ["eliquis"]),
+    "rivaroxaban": ("anticoagulant", ["xarelto"]),
+    "clopidogrel": ("antiplatelet", ["plavix"]),
+    "lisinopril": ("ace_inhibitor", ["zestril", "prinivil"]),
+    "enalapril": ("ace_inhibitor", ["vasotec"]),
+    "ramipril": ("ace_inhibitor", ["altace"]),
+    "losartan": ("arb", ["cozaar"]),
+    "valsartan": ("arb", ["diovan"]),
+    "spironolactone": ("potassium_sparing", ["aldactone"]),
+    "amiloride": ("potassium_sparing", ["midamor"]),
+    "potassium chloride": ("potassium", ["kcl", "k-dur", "klor-con"]),
+    "furosemide": ("loop_diuretic", ["lasix"]),
+    "metoprolol": ("beta_blocker", ["lopressor", "toprol"]),
+    "atenolol": ("beta_blocker", ["tenormin"]),
+    "amlodipine": ("calcium_channel_blocker", ["norvasc"]),
+    "nitroglycerin": ("nitrate", ["gtn", "nitrostat", "glyceryl trinitrate"]),
+    "isosorbide mononitrate": ("nitrate", ["imdur", "isosorbide"]),
+    "amiodarone": ("antiarrhythmic", ["cordarone", "pacerone"]),
+    "digoxin": ("cardiac_glycoside", ["lanoxin"]),
+    "simvastatin": ("statin", ["zocor"]),
+    "atorvastatin": ("statin", ["lipitor"]),
+    "sildenafil": ("pde5_inhibitor", ["viagra", "revatio"]),
+    "tadalafil": ("pde5_inhibitor", ["cialis"]),
+    # CNS
+    "sertraline": ("ssri", ["zoloft"]),
+    "fluoxetine": ("ssri", ["prozac"]),
+    "citalopram": ("ssri", ["celexa"]),
+    "escitalopram": ("ssri", ["lexapro"]),
+    "phenelzine": ("maoi", ["nardil"]),
+    "selegiline": ("maoi", ["emsam", "eldepryl"]),
+    "linezolid": ("maoi", ["zyvox"]),  # Weak MAO inhibitor: same serotonergic risk
+    "lithium": ("mood_stabilizer", ["lithobid", "priadel"]),
+    "lorazepam": ("benzodiazepine", ["ativan"]),
+    "diazepam": ("benzodiazepine", ["valium"]),
+    "midazolam": ("benzodiazepine", ["versed"]),
+    "ondansetron": ("antiemetic", ["zofran"]),
+    # Other
+    "metformin": ("biguanide", ["glucophage"]),
+    "insulin": ("insulin", ["lantus", "humalog", "novolog", "insulin glargine"]),
+    "prednisone": ("corticosteroid", ["deltasone"]),
+    "methotrexate": ("antifolate", ["trexall", "otrexup"]),
+    "iodinated contrast": ("contrast", ["iv contrast", "contrast dye", "iohexol", "omnipaque"]),
+    "magicpill": ("experimental", ["magic pill"]),
+}
+
+# Class names as written in allergy lists ("allergic to sulfa", "NSAID intolerance")
+CLASS_TERMS = {
+    "penicillin": ["penicillins", "beta-lactam", "beta lactam", "beta-lactams"],
+    "cephalosporin": ["cephalosporin", "cephalosporins"],
+    "carbapenem": ["carbapenem", "carbapenems"],
+    "macrolide": ["macrolide", "macrolides"],
+    "fluoroquinolone": ["fluoroquinolone", "fluoroquinolones", "quinolone", "quinolones"],
+    "tetracycline": ["tetracycline", "tetracyclines"],
+    "sulfonamide_antibiotic": ["sulfa", "sulfa drugs", "sulfonamide", "sulfonamides", "sulpha"],
+    "aminoglycoside": ["aminoglycoside", "aminoglycosides"],
+    "nsaid": ["nsaid", "nsaids", "anti-inflammatories"],
+    "opioid": ["opioid", "opioids", "opiate", "opiates", "narcotics"],
+    "ace_inhibitor": ["ace inhibitor", "ace inhibitors", "ace-i"],
+    "statin": ["statin", "statins"],
+    "benzodiazepine": ["benzodiazepine", "benzodiazepines", "benzos"],
+    "contrast": ["contrast", "iodine"],
+}
+
+# allergy class -> [(class that reacts, why)]; same-class is always a true allergy
+CROSS_REACTIVITY = {
+    "penicillin": [("cephalosporin", "possible penicillin/cephalosporin cross-reactivity"),
+                   ("carbapenem", "possible penicillin/carbapenem cross-reactivity")],
+    "cephalosporin": [("penicillin", "possible cephalosporin/penicillin cross-reactivity"),
+                      ("carbapenem", "possible cephalosporin/carbapenem cross-reactivity")],
+    "carbapenem": [("penicillin", "possible carbapenem/penicillin cross-reactivity")],
+    "salicylate": [("nsaid", "aspirin-exacerbated reactions extend to NSAIDs")],
+    "nsaid": [("salicylate", "NSAID reactions extend to aspirin")],
+}
+
+# Pairs of (class or generic name) -> risk. Checked across the plan and the patient's current medications.
+INTERACTIONS = {
+    frozenset(["anticoagulant", "nsaid"]): "bleeding risk (anticoagulant + NSAID)",
+    frozenset(["anticoagulant", "salicylate"]): "bleeding risk (anticoagulant + aspirin)",
+    frozenset(["anticoagulant", "antiplatelet"]): "bleeding risk (anticoagulant + antiplatelet)",
+    frozenset(["warfarin", "fluoroquinolone"]): "raised INR (warfarin + fluoroquinolone)",
+    frozenset(["warfarin", "metronidazole"]): "raised INR (warfarin + metronidazole)",
+    frozenset(["warfarin", "sulfamethoxazole-trimethoprim"]): "raised INR (warfarin + co-trimoxazole)",
+    frozenset(["ssri", "maoi"]): "serotonin syndrome (SSRI + MAOI)",
+    frozenset(["ssri", "tramadol"]): "serotonin syndrome (SSRI + tramadol)",
+    frozenset(["maoi", "tramadol"]): "serotonin syndrome (MAOI + tramadol)",
+    frozenset(["nitrate", "pde5_inhibitor"]): "severe hypotension (nitrate + PDE5 inhibitor)",
+    frozenset(["ace_inhibitor", "potassium_sparing"]): "hyperkalaemia (ACE inhibitor + potassium-sparing diuretic)",
+    frozenset(["arb", "potassium_sparing"]): "hyperkalaemia (ARB + potassium-sparing diuretic)",
+    frozenset(["ace_inhibitor", "potassium"]): "hyperkalaemia (ACE inhibitor + potassium supplement)",
+    frozenset(["opioid", "benzodiazepine"]): "respiratory depression (opioid + benzodiazepine)",
+    frozenset(["simvastatin", "clarithromycin"]): "rhabdomyolysis (simvastatin + clarithromycin)",
+    frozenset(["simvastatin", "erythromycin"]): "rhabdomyolysis (simvastatin + erythromycin)",
+    frozenset(["methotrexate", "sulfamethoxazole-trimethoprim"]): "bone marrow suppression (methotrexate + co-trimoxazole)",
+    frozenset(["methotrexate", "trimethoprim"]): "bone marrow suppression (methotrexate + trimethoprim)",
+    frozenset(["lithium", "nsaid"]): "lithium toxicity (lithium + NSAID)",
+    frozenset(["lithium", "ace_inhibitor"]): "lithium toxicity (lithium + ACE inhibitor)",
+    frozenset(["digoxin", "amiodarone"]): "digoxin toxicity (digoxin + amiodarone)",
+    frozenset(["metformin", "contrast"]): "lactic acidosis risk (metformin + iodinated contrast)",
+}
+
+# Allergies that have nothing to do with the pharmacy (no need to escalate them)
+NON_DRUG_ALLERGENS = ["peanut", "nut", "shellfish", "seafood", "egg", "milk", "dairy", "gluten", "wheat", "soy",
+                      "latex", "pollen", "dust", "mold", "mould", "cat", "dog", "bee", "wasp", "grass", "hay fever"]
+NON_DRUG_ALLERGY = re.compile(r"\b(?:" + "|".join(NON_DRUG_ALLERGENS) + r")s?\b", re.I)   # Whole words: "bee" is not "been"
+
+ALLERGY_CUE = re.compile(r"allerg|anaphyla|intoleran|sensitiv|reaction to|rash (?:with|from|to)|hives", re.I)
+NO_ALLERGIES = re.compile(r"\b(?:nkda|nka|no known (?:drug )?allergies|no (?:drug )?allergies|denies (?:any )?allergies)\b", re.I)
+# Negation only counts when it governs the drug itself: "stop the warfarin", not "if no improvement start amoxicillin"
+NEGATION = re.compile(r"\b(?:avoid|avoiding|no|not|stop|stopped|discontinue|discontinued|hold|held|instead of|contraindicated|allergic to|without)"
+                      r"\s+(?:(?:the|any|all|further|more|his|her|their|current|regular|oral|iv|on|give|giving|start|starting|use|using|take|taking|prescribe|continue|restart|with)\s+){0,2}$", re.I)
+DOSE = re.compile(r"\b\d+(?:\.\d+)?\s?(?:mg|mcg|µg|g|ml|units?|iu)\b|\b(?:tablet|capsule|bid|tid|qid|prn|q\d+h)\b", re.I)
+PRESCRIBING = re.compile(r"\b(?:give|giving|start|starting|commence|initiate|administer|prescribe|prescribing)\b", re.I)
+CLAUSE_SPLIT = re.compile(r"[.;\n]")
+SEGMENT_SPLIT = re.compile(r",|\b(?:and|but|while|whereas|also|plus)\b", re.I)   # "Allergic to X, on Y" is two facts
+MEDICATION_CUE = re.compile(r"\b(?:on|takes?|taking|uses?|using|currently|started|prescribed|medications?|meds)\b", re.I)
+
+# --- MULTI-PATTERN MATCHING ---
+
+class Automaton:
+    """Aho-Corasick automaton: finds every dictionary term in one pass over the text."""
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+    def add(self, term: str, value):
+        node = 0
+        for ch in term:
+            if ch not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[node][ch] = len(self.goto) - 1
+            node = self.goto[node][ch]
+        self.out[node].append((term, value))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0) if self.goto[f].get(ch, 0) != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+        return self
+
+    def iter(self, text: str):
+        """Yields (start, end, term, value) for every occurrence (overlaps included)."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for term, value in self.out[node]:
+                yield i - len(term) + 1, i + 1, term, value
+
+@dataclass
+class Mention:
+    start: int
+    end: int
+    term: str
+    kind: str   # "drug" or "class"
+    name: str   # Generic name or class name
+
+@dataclass
+class SafetyVerdict:
+    status: str                          # "WARNING", "SAFE" or "AMBIGUOUS"
+    reasons: list = field(default_factory=list)
+    prescribed: list = field(default_factory=list)
+    allergies: list = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return f"{self.status}: {'; '.join(self.reasons)}."
+
+class PharmacologyEngine:
+    """
+    Deterministic medication review: finds drugs in the plan, allergies and current meds in the
+    history, then applies the cross-reactivity and interaction tables. Flags AMBIGUOUS only when
+    something could not be resolved (an unknown drug allergen, a medication given or dosed that is
+    not in the lexicon, or a negated drug that is still dosed).
+    """
+    def __init__(self, drugs=DRUGS, class_terms=CLASS_TERMS):
+        self.drug_class = {name: cls for name, (cls, _) in drugs.items()}
+        self.automaton = Automaton()
+        for name, (_, synonyms) in drugs.items():
+            for term in [name, *synonyms]:
+                self.automaton.add(term.lower(), ("drug", name))
+        for cls, terms in class_terms.items():
+            for term in terms:
+                self.automaton.add(term.lower(), ("class", cls))
+        self.automaton.build()
+
+    # --- SCANNING ---
+    def scan(self, text: str):
+        """All lexicon mentions, whole words only, longest match wins on overlaps."""
+        lowered = text.lower()
+        found = []
+        for start, end, term, (kind, name) in self.automaton.iter(lowered):
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            if end < len(lowered) and lowered[end].isalnum():
+                continue
+            found.append(Mention(start, end, term, kind, name))
+        found.sort(key=lambda m: (m.start, -(m.end - m.start)))
+        mentions, last_end = [], -1
+        for m in found:
+            if m.start >= last_end:
+                mentions.append(m)
+                last_end = m.end
+        return mentions
+
+    def _plan_section(self, soap_note: str) -> str:
+        match = re.search(r"plan\s*:", soap_note, re.I)
+        return soap_note[match.end():] if match else soap_note
+
+    def prescribed(self, soap_note: str):
+        """(drugs the plan actually gives, unrecognized medication given, unsure negation)."""
+        plan = self._plan_section(soap_note)
+        drugs, unknown_meds, uncertain = [], False, False
+        for clause in CLAUSE_SPLIT.split(plan):
+            mentions = [m for m in self.scan(clause) if m.kind == "drug"]
+            for m in mentions:
+                if NEGATION.search(clause[:m.start]):
+                    if DOSE.search(SEGMENT_SPLIT.split(clause[m.end:], 1)[0]):
+                        uncertain = True  # "No amoxicillin 500 mg tid": negated, yet dosed
+                    continue
+                if m.name not in drugs:
+                    drugs.append(m.name)
+            if not mentions and (DOSE.search(clause) or PRESCRIBING.search(clause)):
+                unknown_meds = True  # Something is being given or dosed that we don't know
+        return drugs, unknown_meds, uncertain
+
+    def history_profile(self, history: str):
+        """(allergens as ("drug"|"class", name), current meds, unresolved allergy clauses)."""
+        allergens, current, unresolved = [], [], []
+
+        def add(items, item):
+            if item not in items:
+                items.append(item)
+
+        for clause in CLAUSE_SPLIT.split(history or ""):
+            allergy = inherited = False   # Segments without a cue of their own continue the previous one
+            for segment in SEGMENT_SPLIT.split(clause):
+                mentions = self.scan(segment)
+                if NO_ALLERGIES.search(segment):
+                    allergy = False
+                    continue
+                if ALLERGY_CUE.search(segment):
+                    allergy, inherited = True, False
+                elif MEDICATION_CUE.search(segment):
+                    allergy = False
+                else:
+                    inherited = True
+                if allergy:
+                    for m in mentions:
+                        add(allergens, (m.kind, m.name))
+                        if inherited and m.kind == "drug":
+                            add(current, m.name)   # "Allergic to X, Y" may list a med: keep both readings
+                    if not mentions and not inherited and not NON_DRUG_ALLERGY.search(segment):
+                        unresolved.append(segment.strip())
+                else:
+                    for m in mentions:
+                        if m.kind == "drug" and not NEGATION.search(segment[:m.start]):
+                            add(current, m.name)
+        return allergens, current, unresolved
+
+    # --- RULES ---
+    def _allergy_conflicts(self, drugs, allergens):
+        reasons = []
+        for drug in drugs:
+            cls = self.drug_class[drug]
+            for kind, name in allergens:
+                allergy_class = self.drug_class[name] if kind == "drug" else name
+                if (kind == "drug" and name == drug) or (kind == "class" and name == cls):
+                    reasons.append(f"Patient is allergic to {name.replace('_', ' ').title()} ({drug} prescribed)")
+                elif allergy_class == cls:
+                    reasons.append(f"Patient is allergic to {name.title()}, same class as {drug} ({cls.replace('_', ' ')})")
+                else:
+                    for reacting, why in CROSS_REACTIVITY.get(allergy_class, []):
+                        if reacting == cls:
+                            reasons.append(f"{why.capitalize()} ({name} allergy, {drug} prescribed)")
+        return reasons
+
+    def _interactions(self, drugs, current):
+        reasons = []
+        combined = list(dict.fromkeys(drugs + current))
+        for i, a in enumerate(combined):
+            for b in combined[i + 1:]:
+                if a not in drugs and b not in drugs:
+                    continue  # Both pre-existing: not this plan's responsibility
+                for x in (a, self.drug_class[a]):
+                    for y in (b, self.drug_class[b]):
+                        risk = INTERACTIONS.get(frozenset([x, y]))
+                        if risk and x != y:
+                            reasons.append(f"Interaction {a} + {b}: {risk}")
+        return list(dict.fromkeys(reasons))
+
+    def review(self, soap_note: str, history: str) -> SafetyVerdict:
+        drugs, unknown_meds, uncertain = self.prescribed(soap_note)
+        allergens, current, unresolved = self.history_profile(history)
+
+        reasons = [f"Experimental Protocol ({d})" for d in drugs if self.drug_class[d] == "experimental"]
+        reasons += self._allergy_conflicts(drugs, allergens)
+        reasons += self._interactions(drugs, current)
+        if reasons:
+            return SafetyVerdict("WARNING", reasons, drugs, allergens)
+
+        why = []
+        if unknown_meds:
+            why.append("plan gives a medication not in the lexicon")
+        if uncertain:
+            why.append("plan negates a medication it also doses")
+        if unresolved:
+            # The allergen may be a drug we don't know ("Allergic to metoclopramide"): let the model read the plan
+            why.append(f"unrecognized allergy: {' / '.join(unresolved)}")
+        if why:
+            return SafetyVerdict("AMBIGUOUS", why, drugs, allergens)
+
+        if not drugs:
+            return SafetyVerdict("SAFE", ["No medications prescribed"], drugs, allergens)
+        return SafetyVerdict("SAFE", ["Standard protocol approved"], drugs, allergens)
+
+pharmacology_engine = PharmacologyEngine()
@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app.services.hearing import hearing_service, REPLICAS as WHISPER_REPLICAS
+from app.services.vision import vision_service
+from app.services.brain import brain_service
+from app.services.pharmacist import pharmacist_service
+from app.services.prefetch import prefetcher
+
+# Configuration
+# One executor per stage so a slow Whisper decode never starves the LLM stages (and vice versa).
+# Threads are cheap waiters here: the Whisper pool and the LLM gateway's model slots decide how
+# many actually run (and in which priority order), so keep these above those limits.
+STAGE_WORKERS = {
+    "hearing": max(8, WHISPER_REPLICAS * 2),
+    "vision": 4,
+    "brain": 8,
+}
+
+class ConsultationPipeline:
+    """
+    Runs the blocking agents (Whisper, LLaVA, Llama) on managed thread pools so the
+    event loop stays free. Vision and Hearing run side by side; Brain and Pharmacist follow.
+    """
+    def __init__(self):
+        self.executors = {
+            stage: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"vitalis-{stage}")
+            for stage, workers in STAGE_WORKERS.items()
+        }
+
+    async def run_stage(self, stage: str, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Carry context variables (request scoped state, job priority) into the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executors[stage], partial(ctx.run, fn, *args, **kwargs))
+
+    async def iterate_stage(self, stage: str, gen_fn, *args, **kwargs):
+        """
+        Drives a blocking generator on the stage executor and re-yields its items
+        on the event loop as they are produced.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            items = gen_fn(*args, **kwargs)
+            try:
+                for item in items:
+                    if stop.is_set():
+                        break  # Client went away: closing the generator below cancels the decode
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                items.close()  # Lets the generator release its model slot right away
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        ctx = contextvars.copy_context()
+        future = loop.run_in_executor(self.executors[stage], partial(ctx.run, produce))
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            await asyncio.wait([future])
+
+    async def _see(self, image):
+        if not image:
+            return "No image provided."
+        return await self.run_stage("vision", vision_service.analyze_image, image)
+
+    async def run(self, audio, image, patient_context: str, use_rag: bool = True, beam_size=None, audio_hash=None, patient_name: str = None):
+        # 1. Perception (Parallel): Whisper and LLaVA don't depend on each other
+        transcript, visual_findings = await asyncio.gather(
+            self.run_stage("hearing", hearing_service.transcribe_audio, audio, beam_size=beam_size, content_hash=audio_hash),
+            self._see(image),
+        )
+
+        # 2. Reasoning (Sequential): SOAP note, then the safety review of its plan
+        combined_input = f"AUDIO TRANSCRIPT: {transcript}\n\nVISUAL FINDINGS FROM IMAGE: {visual_findings}"
+        result = await self.analyze(combined_input, patient_context, use_rag=use_rag, patient_name=patient_name)
+
+        return {
+            "transcript": transcript,
+            "visual_analysis": visual_findings,
+            **result,
+        }
+
+    async def analyze(self, text: str, patient_context: str, use_rag: bool = True, patient_name: str = None):
+        soap_note = await self.run_stage("brain", brain_service.generate_soap_note, text, use_rag=use_rag)
+        safety_check = await self.review(soap_note, patient_context, patient_name)
+        return {"soap_note": soap_note, "safety_analysis": safety_check}
+
+    async def review(self, soap_note: str, patient_context: str, patient_name: str = None):
+        """Safety review of a fresh note; in prefetch mode the other follow-ups start alongside it."""
+        safety = prefetcher.schedule(soap_note, patient_context, patient_name)
+        if safety is not None:
+            return await asyncio.wrap_future(safety)
+        return await self.run_stage("brain", pharmacist_service.check_safety, soap_note, patient_context)
+
+    async def stream(self, audio, image, patient_context: str, use_rag: bool = True, beam_size=None, audio_hash=None, patient_name: str = None):
+        """
+        Streaming variant of run(): yields (event, data) pairs.
+        Transcript segments first, then SOAP tokens (plus each section once complete),
+        then the Pharmacist verdict.
+        """
+        vision_task = asyncio.create_task(self._see(image))
+        try:
+            # 1. Hearing: one event per Whisper segment (Vision keeps working meanwhile)
+            transcript = ""
+            async for segment in self.iterate_stage("hearing", hearing_service.stream_segments, audio, beam_size=beam_size, content_hash=audio_hash):
+                transcript += segment.text + " "
+                yield "segment", {"start": segment.start, "end": segment.end, "text": segment.text}
+            transcript = transcript.strip()
+            yield "transcript", {"text": transcript}
+
+            visual_findings = await vision_task
+            yield "visual_analysis", {"text": visual_findings}
+        finally:
+            if not vision_task.done():
+                vision_task.cancel()
+
+        # 2. Brain: SOAP tokens as Llama produces them
+        combined_input = f"AUDIO TRANSCRIPT: {transcript}\n\nVISUAL FINDINGS FROM IMAGE: {visual_findings}"
+        soap_note = ""
+        async for kind, value in self.iterate_stage("brain", brain_service.stream_soap_note, combined_input, use_rag=use_rag):
+            if kind == "token":
+                yield "token", {"text": value}
+            elif kind == "section":
+                yield "soap_section", value
+            else:
+                soap_note = value
+        yield "soap_note", {"text": soap_note}
+
+        # 3. Pharmacist verdict
+        safety_check = await self.review(soap_note, patient_context, patient_name)
+        yield "safety_analysis", {"text": safety_check}
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        prefetcher.shutdown()
+
+consultation_pipeline = ConsultationPipeline()
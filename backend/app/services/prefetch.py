@@ -0,0 +1,91 @@
+import os
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.cache import make_key
+from app.services.brain import brain_service
+from app.services.house import house_service
+from app.services.pharmacist import pharmacist_service
+
+# Configuration
+PREFETCH = os.getenv("VITALIS_PREFETCH", "0") == "1"   # Opt-in: spends LLM time the user may never ask for
+PREFETCH_WORKERS = 6
+MAX_ENTRIES = 256   # Most recent notes kept (futures hold the finished results)
+
+class Prefetcher:
+    """
+    Speculative fan-out once a SOAP note exists: the safety review, the second opinion and the
+    patient explanation start together in the background, keyed by a hash of the note.
+    /second-opinion/ and /explain/ then pick up the finished result, or wait on the running task.
+    """
+    def __init__(self, enabled: bool = PREFETCH):
+        self.enabled = enabled
+        self.executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        self.entries = OrderedDict()   # key -> concurrent.futures.Future
+        self.hits = 0
+        self.attached = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, kind: str, soap_note: str, *extra):
+        return make_key(kind, soap_note.strip(), *extra)
+
+    def submit(self, kind: str, fn, soap_note: str, *args):
+        key = self._key(kind, soap_note, *args)
+        with self._lock:
+            future = self.entries.get(key)
+            if future is not None and not (future.done() and future.exception()):
+                return future
+            # Inherit the caller's priority (an ED consult prefetches at ED priority)
+            ctx = contextvars.copy_context()
+            future = self.executor.submit(ctx.run, fn, soap_note, *args)
+            self.entries[key] = future
+            while len(self.entries) > MAX_ENTRIES:
+                self.entries.popitem(last=False)
+        return future
+
+    def schedule(self, soap_note: str, patient_context: str, patient_name: str = None):
+        """Starts every follow-up for a fresh note. Returns the safety-check future (or None if disabled)."""
+        if not self.enabled:
+            return None
+        safety = self.submit("safety", pharmacist_service.check_safety, soap_note, patient_context)
+        self.submit("ddx", house_service.get_second_opinion, soap_note)
+        if patient_name:
+            self.submit("explain", brain_service.explain_plan, soap_note, patient_name)
+        return safety
+
+    async def attach(self, kind: str, soap_note: str, *args):
+        """Result of a prefetched task (waiting if it is still running), or None if there is none."""
+        with self._lock:
+            future = self.entries.get(self._key(kind, soap_note, *args))
+            if future is None:
+                self.misses += 1
+                return None
+            if future.done():
+                self.hits += 1
+            else:
+                self.attached += 1
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            return None  # Let the endpoint run it for real
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for f in self.entries.values() if not f.done())
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "running": running,
+                "hits": self.hits,
+                "attached": self.attached,
+                "misses": self.misses,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+prefetcher = Prefetcher()
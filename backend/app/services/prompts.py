@@ -0,0 +1,210 @@
+import os
+import re
+import math
+import threading
+
+# Configuration
+CONTEXT_TOKENS = int(os.getenv("VITALIS_CONTEXT_TOKENS", "4096"))   # num_ctx Ollama runs llama3.2 with
+OUTPUT_RESERVE = int(os.getenv("VITALIS_OUTPUT_TOKENS", "768"))     # Room left for the answer
+CHARS_PER_TOKEN = 3.5   # Fallback estimate when no tokenizer is available (conservative for Llama 3)
+
+# Hugging Face tokenizer per Ollama model: a local tokenizer.json (or its directory), or a repo id
+# already in the HF cache. Never downloaded at runtime; fetch it once with
+#   huggingface-cli download unsloth/Llama-3.2-3B-Instruct tokenizer.json
+TOKENIZERS = {
+    "llama3.2": os.getenv("VITALIS_TOKENIZER_LLAMA", "unsloth/Llama-3.2-3B-Instruct"),
+}
+
+TRUNCATED = " …[truncated]"
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;\n])\s+")
+
+class TokenCounter:
+    """Counts with the model's own tokenizer (loaded on first use); falls back to a char estimate offline."""
+    def __init__(self, model: str):
+        self.model = model
+        self._tokenizer = None
+        self._tried = False
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if not self._tried:
+            with self._lock:
+                if not self._tried:
+                    self._tokenizer = self._load()
+                    self._tried = True
+        return self._tokenizer
+
+    def _load(self):
+        source = TOKENIZERS.get(self.model)
+        if not source:
+            return None
+        try:
+            from tokenizers import Tokenizer
+            path = self._resolve(source)
+            if path is None:
+                print(f"⚠️ Tokenizer for {self.model} ({source}) not found locally; estimating tokens from length.")
+                return None
+            return Tokenizer.from_file(path)
+        except Exception as e:
+            print(f"⚠️ No tokenizer for {self.model} ({e}); estimating tokens from length.")
+            return None
+
+    @staticmethod
+    def _resolve(source: str):
+        """Local tokenizer.json for a path or a cached repo id, without touching the network."""
+        if os.path.isdir(source):
+            source = os.path.join(source, "tokenizer.json")
+        if os.path.isfile(source):
+            return source
+        from huggingface_hub import try_to_load_from_cache
+        cached = try_to_load_from_cache(source, "tokenizer.json")
+        return cached if isinstance(cached, str) else None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        """Cuts text to max_tokens, keeping the start ("head"), the end ("tail") or both ends ("middle")."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        room = max(max_tokens - self.count(TRUNCATED) - 1, 1)   # The marker counts against the budget
+        if keep == "middle":
+            half = room // 2
+            return self._head(text, half) + TRUNCATED + " " + self._tail(text, room - half)
+        if keep == "tail":
+            return TRUNCATED.strip() + " " + self._tail(text, room)
+        return self._head(text, room) + TRUNCATED
+
+    def _head(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            return text[:offsets[min(max_tokens, len(offsets)) - 1][1]]
+        return text[:int(max_tokens * CHARS_PER_TOKEN)]
+
+    def _tail(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            return text[offsets[-min(max_tokens, len(offsets))][0]:]
+        chars = int(max_tokens * CHARS_PER_TOKEN)
+        return text[-chars:] if chars else ""
+
+class Section:
+    """
+    One variable part of a prompt.
+      weight:   share of the budget relative to the other sections
+      keep:     "head" | "tail" | "middle" truncation, or "salient" (sentences, or rows when a
+                separator is given, matching `priority` first, then the rest, until the budget is spent;
+                the first row that no longer fits is cut to the tokens left)
+      separator: row delimiter string, or a regex whose matches split the rows (rows are then
+                joined back with newlines)
+    """
+    def __init__(self, text: str, weight: float = 1.0, keep: str = "head", priority=None, separator: str = None):
+        self.text = text or ""
+        self.weight = weight
+        self.keep = keep
+        self.priority = priority
+        self.separator = separator
+
+class PromptBudget:
+    """
+    Fits the variable sections of a prompt (transcript, visuals, protocol, history...) into the
+    model's context window: budget = context - answer reserve - fixed template, shared by weight.
+    Sections that need less than their share hand the rest to the others.
+    """
+    def __init__(self, model: str, context_tokens: int = CONTEXT_TOKENS, output_tokens: int = OUTPUT_RESERVE):
+        self.counter = _counter(model)
+        self.limit = context_tokens - output_tokens
+
+    def fit(self, label: str, template: str, **sections: Section):
+        """Returns {name: fitted text}. `template` is the fixed prompt text (used only for counting)."""
+        fixed = self.counter.count(template)
+        budget = max(self.limit - fixed, 64)
+        needs = {name: self.counter.count(s.text) for name, s in sections.items()}
+
+        # Water-filling: satisfy the small sections fully, split what is left among the big ones
+        allocation = {}
+        pending = dict(sections)
+        remaining = budget
+        while pending:
+            total_weight = sum(s.weight for s in pending.values())
+            satisfied = {n for n, s in pending.items() if needs[n] <= remaining * s.weight / total_weight}
+            if not satisfied:
+                for n, s in pending.items():
+                    allocation[n] = int(remaining * s.weight / total_weight)
+                break
+            for n in satisfied:
+                allocation[n] = needs[n]
+                remaining -= needs[n]
+                del pending[n]
+
+        # Sections that came in under their allocation (rows that can't be split any finer,
+        # truncation markers) hand the surplus to the sections that were cut
+        fitted, used = {}, {}
+        for name, section in sections.items():
+            fitted[name], used[name] = self._fit_section(section, needs[name], allocation[name])
+        cut = {n: s for n, s in sections.items() if fitted[n] is not s.text}
+        spare = budget - sum(used.values()) - len(cut)   # One token each for count rounding
+        if spare > 0 and cut:
+            total_weight = sum(s.weight for s in cut.values())
+            for name, section in cut.items():
+                allocation[name] = used[name] + int(spare * section.weight / total_weight)
+                fitted[name], used[name] = self._fit_section(section, needs[name], allocation[name])
+
+        total = fixed + sum(used.values())
+        report = ", ".join(f"{name} {used[name]}/{needs[name]}" for name in sections)
+        print(f"🧾 {label}: {total} prompt tokens (limit {self.limit}) — template {fixed}, {report}")
+        return fitted
+
+    def _fit_section(self, section: Section, need: int, tokens: int):
+        """(fitted text, tokens used)"""
+        if need <= tokens:
+            return section.text, need
+        if section.keep == "salient":
+            text = self._salient(section, tokens)
+        else:
+            text = self.counter.truncate(section.text, tokens, section.keep)
+        return text, self.counter.count(text)
+
+    def _salient(self, section: Section, max_tokens: int) -> str:
+        if isinstance(section.separator, re.Pattern):
+            joiner, raw = "\n", section.separator.split(section.text)
+        elif section.separator:
+            joiner, raw = section.separator, section.text.split(section.separator)
+        else:
+            joiner, raw = " ", SENTENCE_SPLIT.split(section.text)
+        parts = [p for p in raw if p.strip()]
+        matches = [i for i, p in enumerate(parts) if section.priority and section.priority.search(p)]
+        order = matches + [i for i in range(len(parts)) if i not in set(matches)]
+        budget = max_tokens - self.counter.count(f"{joiner}…[{len(parts)} more omitted]")   # Room for the notice
+        chosen, used = {}, 0
+        for i in order:
+            cost = self.counter.count(parts[i]) + 1
+            if used + cost <= budget:
+                chosen[i] = parts[i]
+                used += cost
+            elif budget - used > 1:
+                chosen[i] = self.counter.truncate(parts[i], budget - used - 1, "head")  # Spend what is left, then stop
+                break
+        kept = [chosen[i] for i in sorted(chosen)]
+        dropped = len(parts) - len(kept)
+        return joiner.join(kept) + (f"{joiner}…[{dropped} more omitted]" if dropped else "")
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+def _counter(model: str) -> TokenCounter:
+    with _counters_lock:
+        if model not in _counters:
+            _counters[model] = TokenCounter(model)
+        return _counters[model]
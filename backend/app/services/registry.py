@@ -1,10 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime
+from contextlib import contextmanager
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship, selectinload
 from datetime import datetime
+from app.services.container import container
+from app.services.database import write_engine, WriteSession, ReadSession
 
 Base = declarative_base()
 
+PATIENT_FIELDS = ("id", "name", "age", "medical_history")
+PREVIEW_CHARS = 160   # Note preview in history summaries
+
 class Patient(Base):
     __tablename__ = "patients"
     id = Column(Integer, primary_key=True, index=True)
@@ -26,6 +32,9 @@ class Consultation(Base):
     
     patient = relationship("Patient", back_populates="consultations")
 
+    # History pages: one patient's consultations, newest first
+    __table_args__ = (Index("ix_consultations_patient_id_id", "patient_id", "id"),)
+
 # NEW: LAB RESULT TABLE
 class LabResult(Base):
     __tablename__ = "lab_results"
@@ -39,55 +48,170 @@ class LabResult(Base):
     
     patient = relationship("Patient", back_populates="lab_results")
 
-# Setup DB
-engine = create_engine("sqlite:///./vitalis.db", connect_args={"check_same_thread": False})
-Base.metadata.create_all(bind=engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    __table_args__ = (Index("ix_lab_results_patient_id_date", "patient_id", "date"),)
+
+def create_schema():
+    Base.metadata.create_all(bind=write_engine)
+    # create_all skips tables that already exist: add indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=write_engine, checkfirst=True)
+    return write_engine
 
 class RegistryService:
+    """
+    Patient registry. Every call runs in a session: the caller's (one per request via the
+    get_db / get_read_db dependencies) or a short one of its own (jobs, agents, WebSockets).
+    """
     def __init__(self):
-        self.db = SessionLocal()
+        # Schema check happens on first session (or during warmup), not at import
+        self._schema = container.register("registry", create_schema)
+
+    @contextmanager
+    def session(self, write: bool = False):
+        """A pooled session: write sessions commit on success and roll back on error."""
+        self._schema.get()
+        session = (WriteSession if write else ReadSession)()
+        try:
+            yield session
+            if write:
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @contextmanager
+    def _use(self, db, write: bool = False):
+        if db is not None:
+            yield db
+        else:
+            with self.session(write) as own:
+                yield own
+
+    def list_patients(self, db=None, fields=PATIENT_FIELDS, limit=None, after=None):
+        """
+        Projected patient rows (only `fields`, always with id) ordered by id, no ORM objects.
+        Keyset pagination: pass the previous page's cursor as `after`. Returns (rows, next cursor).
+        """
+        fields = ("id",) + tuple(f for f in fields if f != "id")
+        with self._use(db) as db:
+            query = db.query(*[getattr(Patient, f) for f in fields]).order_by(Patient.id)
+            if after is not None:
+                query = query.filter(Patient.id > after)
+            if limit:
+                query = query.limit(limit + 1)
+            rows = query.all()
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1].id
+        return rows, None
+
+    def find_patient_by_name(self, name, db=None):
+        with self._use(db) as db:
+            return (
+                db.query(Patient)
+                .options(selectinload(Patient.consultations))
+                .filter(func.lower(Patient.name) == name.lower())
+                .first()
+            )
 
-    def get_all_patients(self):
-        return self.db.query(Patient).all()
+    def create_patient(self, name, age, history, db=None):
+        with self._use(db, write=True) as db:
+            p = Patient(name=name, age=age, medical_history=history)
+            db.add(p)
+            db.commit()
+            db.refresh(p)
+            return p
 
-    def create_patient(self, name, age, history):
-        p = Patient(name=name, age=age, medical_history=history)
-        self.db.add(p)
-        self.db.commit()
-        self.db.refresh(p)
-        return p
+    def get_patient(self, pid, db=None, with_records=False):
+        """with_records: consultations and labs loaded up front (two IN queries, no lazy loads)."""
+        with self._use(db) as db:
+            query = db.query(Patient)
+            if with_records:
+                query = query.options(selectinload(Patient.consultations), selectinload(Patient.lab_results))
+            return query.filter(Patient.id == pid).first()
 
-    def get_patient(self, pid):
-        return self.db.query(Patient).filter(Patient.id == pid).first()
+    def get_patient_summary(self, pid, db=None):
+        with self._use(db) as db:
+            return db.query(Patient.name, Patient.age, Patient.medical_history).filter(Patient.id == pid).first()
 
-    def save_consultation(self, pid, soap, safety):
-        c = Consultation(patient_id=pid, soap_note=soap, safety_analysis=safety)
-        self.db.add(c)
-        self.db.commit()
+    def list_consultations(self, pid, db=None, notes=True, limit=None, before=None):
+        """
+        One patient's consultations, newest first, as projected rows. notes=False leaves out the
+        note bodies (a short preview instead). Keyset pagination on id via `before`.
+        Returns (rows, next cursor).
+        """
+        columns = [Consultation.id, Consultation.timestamp]
+        if notes:
+            columns += [Consultation.soap_note, Consultation.safety_analysis]
+        else:
+            columns.append(func.substr(Consultation.soap_note, 1, PREVIEW_CHARS).label("preview"))
+        with self._use(db) as db:
+            query = db.query(*columns).filter(Consultation.patient_id == pid).order_by(Consultation.id.desc())
+            if before is not None:
+                query = query.filter(Consultation.id < before)
+            if limit:
+                query = query.limit(limit + 1)
+            rows = query.all()
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1].id
+        return rows, None
+
+    def save_consultation(self, pid, soap, safety, db=None):
+        with self._use(db, write=True) as db:
+            c = Consultation(patient_id=pid, soap_note=soap, safety_analysis=safety)
+            db.add(c)
+            db.commit()
+
+    def get_consultation(self, cid, db=None):
+        with self._use(db) as db:
+            return db.query(Consultation).options(selectinload(Consultation.patient)).filter(Consultation.id == cid).first()
+
+    def delete_consultation(self, cid, db=None) -> bool:
+        with self._use(db, write=True) as db:
+            record = db.query(Consultation).filter(Consultation.id == cid).first()
+            if not record:
+                return False
+            db.delete(record)
+            db.commit()
+            return True
 
     # SAVE LABS
-    def save_lab_results(self, pid, results_list):
-        for r in results_list:
-            # Parse the extracted date string (which is now guaranteed to be YYYY-MM-DD or today)
-            date_str = r.get('date', datetime.now().strftime("%Y-%m-%d"))
-            try:
-                entry_date = datetime.strptime(date_str, "%Y-%m-%d")
-            except:
-                entry_date = datetime.now()
-
-            lab = LabResult(
-                patient_id=pid,
-                date=entry_date, # <--- THIS IS CRITICAL
-                test_name=r.get('test_name', 'Unknown'),
-                value=str(r.get('value', '0')),
-                unit=r.get('unit', ''),
-                status=r.get('status', 'Normal')
-            )
-            self.db.add(lab)
-        self.db.commit()
+    def save_lab_results(self, pid, results_list, db=None):
+        with self._use(db, write=True) as db:
+            for r in results_list:
+                # Parse the extracted date string (which is now guaranteed to be YYYY-MM-DD or today)
+                date_str = r.get('date', datetime.now().strftime("%Y-%m-%d"))
+                try:
+                    entry_date = datetime.strptime(date_str, "%Y-%m-%d")
+                except:
+                    entry_date = datetime.now()
+
+                lab = LabResult(
+                    patient_id=pid,
+                    date=entry_date, # <--- THIS IS CRITICAL
+                    test_name=r.get('test_name', 'Unknown'),
+                    value=str(r.get('value', '0')),
+                    unit=r.get('unit', ''),
+                    status=r.get('status', 'Normal')
+                )
+                db.add(lab)
+            db.commit()
+
+    def get_patient_labs(self, pid, db=None):
+        with self._use(db) as db:
+            return db.query(LabResult).filter(LabResult.patient_id == pid).order_by(LabResult.date).all()
+
+registry_service = RegistryService()
 
-    def get_patient_labs(self, pid):
-        return self.db.query(LabResult).filter(LabResult.patient_id == pid).order_by(LabResult.date).all()
+# --- FASTAPI DEPENDENCIES (one session per request, back to the pool afterwards) ---
+def get_db():
+    with registry_service.session(write=True) as session:
+        yield session
 
-registry_service = RegistryService()
\ No newline at end of file
+def get_read_db():
+    with registry_service.session() as session:
+        yield session
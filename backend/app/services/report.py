@@ -1,11 +1,15 @@
 from fpdf import FPDF
 import os
 from datetime import datetime
-import matplotlib
-# Set backend to Non-Interactive 'Agg' to prevent GUI errors
-matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+
+def load_pyplot():
+    # matplotlib is slow to import, so it is only loaded when a chart is drawn
+    import matplotlib
+    # Set backend to Non-Interactive 'Agg' to prevent GUI errors
+    matplotlib.use('Agg') 
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    return plt, mdates
 
 class VitalisPDF(FPDF):
     def header(self):
@@ -191,6 +195,7 @@ class ReportService:
         pdf.chapter_title('HISTORICAL TRENDS')
         
         if len(lab_history) > 0:
+            plt, mdates = load_pyplot()
             unique_tests = sorted(list(set([l.test_name for l in lab_history])))
             
             for test in unique_tests:
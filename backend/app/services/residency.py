@@ -0,0 +1,204 @@
+import os
+import time
+import threading
+from collections import deque
+
+# Configuration
+# Which Ollama models each endpoint ends up calling (preload set + per-request warm-up)
+ENDPOINT_MODELS = {
+    "/consultation/": ["llava", "llama3.2"],
+    "/consultation/stream/": ["llava", "llama3.2"],
+    "/jobs/consultation/": ["llava", "llama3.2"],
+    "/analyze-text/": ["llama3.2"],
+    "/dictation/ws": ["llama3.2"],
+    "/second-opinion/": ["llama3.2"],
+    "/explain/": ["llama3.2"],
+    "/omni/chat/": ["llama3.2"],
+    "/labs/extract/": ["llama3.2"],
+    "/labs/extract/stream/": ["llama3.2"],
+    "/patients/extract-from-pdf/": ["llama3.2"],
+    "/passport/peek/": ["llama3.2"],
+}
+
+def _keep_alive(value: str):
+    # Ollama reads a string keep_alive as a Go duration ("30m"); bare numbers must go as integer seconds
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+# keep_alive sent with every request (-1 = stay loaded until the server needs the memory)
+KEEP_ALIVE = {
+    "llama3.2": _keep_alive(os.getenv("VITALIS_KEEP_ALIVE_LLAMA", "-1")),
+    "llava": _keep_alive(os.getenv("VITALIS_KEEP_ALIVE_LLAVA", "-1")),
+}
+DEFAULT_KEEP_ALIVE = _keep_alive(os.getenv("VITALIS_KEEP_ALIVE", "30m"))
+
+PRELOAD = os.getenv("VITALIS_PRELOAD_MODELS", "1") == "1"
+# How many different models may run at once. Set to 1 on nodes that can't hold llava and
+# llama3.2 together: queued work is then grouped by model instead of swapping on every call.
+MAX_RESIDENT_MODELS = int(os.getenv("VITALIS_MAX_RESIDENT_MODELS", "2"))
+GROUP_SIZE = 8              # Calls a resident model may take while another model waits
+POLL_SECONDS = 5.0          # Ollama /api/ps polling for load/unload events
+LOAD_EVENT_SECONDS = 1.0    # load_duration above this means the request paid for a cold load
+
+def _base_name(name: str) -> str:
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+class ResidencyGate:
+    """
+    Caps how many distinct models run at the same time. While the cap is reached, calls for an
+    already running model keep going (up to GROUP_SIZE in a row if another model is waiting),
+    so work for the same model runs back to back instead of alternating.
+    """
+    def __init__(self, max_models: int):
+        self.max_models = max_models
+        self.active = {}    # model -> running calls
+        self.waiting = {}   # model -> queued calls
+        self.streak = {}    # model -> calls admitted while another model waited
+        self._cond = threading.Condition()
+
+    def _others_waiting(self, model: str) -> bool:
+        return any(n for m, n in self.waiting.items() if n and m != model and m not in self.active)
+
+    def _admissible(self, model: str) -> bool:
+        if model in self.active:
+            return not self._others_waiting(model) or self.streak.get(model, 0) < GROUP_SIZE
+        return len(self.active) < self.max_models
+
+    def acquire(self, model: str):
+        with self._cond:
+            self.waiting[model] = self.waiting.get(model, 0) + 1
+            while not self._admissible(model):
+                self._cond.wait()
+            self.waiting[model] -= 1
+            if self._others_waiting(model):
+                self.streak[model] = self.streak.get(model, 0) + 1
+            self.active[model] = self.active.get(model, 0) + 1
+
+    def release(self, model: str):
+        with self._cond:
+            self.active[model] -= 1
+            if not self.active[model]:
+                del self.active[model]
+                self.streak.pop(model, None)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_models": self.max_models,
+                "active": dict(self.active),
+                "waiting": {m: n for m, n in self.waiting.items() if n},
+            }
+
+class ResidencyManager:
+    """
+    Keeps the models the app needs loaded in Ollama: deliberate keep_alive on every call,
+    preload at startup, per-endpoint warm-up, model grouping (ResidencyGate), and a log of
+    load/unload events from /api/ps and from requests that paid a cold load.
+    """
+    def __init__(self, endpoint_models=None):
+        self.endpoint_models = dict(endpoint_models or ENDPOINT_MODELS)
+        self.gate = ResidencyGate(MAX_RESIDENT_MODELS)
+        self.events = deque(maxlen=200)
+        self.resident = {}          # model -> {"size_vram", "expires_at"} from the last poll
+        self.cold_loads = 0
+        self.cold_load_seconds = 0.0
+        self._client = None
+        self._loading = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+
+    @property
+    def models(self):
+        return sorted({m for models in self.endpoint_models.values() for m in models})
+
+    def keep_alive(self, model: str):
+        return KEEP_ALIVE.get(_base_name(model), DEFAULT_KEEP_ALIVE)
+
+    # --- LIFECYCLE ---
+    def start(self, client):
+        """Called from the app lifespan with the gateway's Ollama client."""
+        self._client = client
+        self._stop.clear()
+        if PRELOAD:
+            for model in self.models:
+                self._load_async(model)
+        self._poller = threading.Thread(target=self._poll, name="ollama-residency", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def prepare(self, endpoint: str):
+        """Warms the models an endpoint is about to need if the server has dropped them."""
+        if self._client is None:
+            return
+        for model in self.endpoint_models.get(endpoint, []):
+            if model not in self.resident:
+                self._load_async(model)
+
+    def _load_async(self, model: str):
+        with self._lock:
+            if model in self._loading:
+                return
+            self._loading.add(model)
+        threading.Thread(target=self._load, args=(model,), name=f"preload-{model}", daemon=True).start()
+
+    def _load(self, model: str):
+        started = time.perf_counter()
+        try:
+            # An empty chat loads the model without generating anything
+            self._client.chat(model=model, messages=[], keep_alive=self.keep_alive(model))
+            self.record("preload", model, seconds=time.perf_counter() - started)
+        except Exception as e:
+            print(f"⚠️ Could not preload {model}: {e}")
+        finally:
+            with self._lock:
+                self._loading.discard(model)
+
+    # --- EVENTS ---
+    def record(self, event: str, model: str, seconds=None):
+        entry = {"event": event, "model": _base_name(model), "timestamp": time.time()}
+        if seconds is not None:
+            entry["seconds"] = round(seconds, 2)
+        self.events.append(entry)
+        print(f"📦 {event}: {entry['model']}" + (f" ({entry['seconds']}s)" if seconds is not None else ""))
+
+    def observe(self, model: str, load_seconds: float):
+        """Fed by the gateway with each response's load_duration."""
+        if load_seconds >= LOAD_EVENT_SECONDS:
+            with self._lock:
+                self.cold_loads += 1
+                self.cold_load_seconds += load_seconds
+            self.record("cold_load", model, seconds=load_seconds)
+
+    def _poll(self):
+        while not self._stop.wait(POLL_SECONDS):
+            try:
+                running = self._client.ps()
+            except Exception:
+                continue  # Ollama down or restarting: try again next tick
+            current = {
+                _base_name(m.model): {"size_vram": m.size_vram, "expires_at": str(m.expires_at)}
+                for m in running.models
+            }
+            for model in current.keys() - self.resident.keys():
+                self.record("load", model)
+            for model in self.resident.keys() - current.keys():
+                self.record("unload", model)
+            self.resident = current
+
+    def stats(self):
+        return {
+            "resident": self.resident,
+            "keep_alive": {m: self.keep_alive(m) for m in self.models},
+            "gate": self.gate.stats(),
+            "cold_loads": self.cold_loads,
+            "cold_load_seconds": round(self.cold_load_seconds, 2),
+            "events": list(self.events)[-50:],
+        }
+
+residency_manager = ResidencyManager()
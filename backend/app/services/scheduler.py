@@ -0,0 +1,91 @@
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Configuration
+# Max concurrent work per model. Everything above this waits in a priority queue
+# instead of oversubscribing the CPU.
+# (Whisper is not listed: the WhisperPool in hearing.py sizes and queues its own replicas.)
+MODEL_LIMITS = {
+    "llava": 1,
+    "llama3.2": 2,
+}
+DEFAULT_LIMIT = 1
+
+# Lower number = served first
+PRIORITIES = {
+    "ed": 0,        # Emergency Department jumps the queue
+    "urgent": 1,
+    "routine": 5,
+    "batch": 9,
+}
+
+# Priority of the work running in the current context (set by the job workers)
+current_priority = contextvars.ContextVar("current_priority", default=PRIORITIES["routine"])
+
+def resolve_priority(value) -> int:
+    if isinstance(value, int):
+        return value
+    return PRIORITIES.get(str(value).lower(), PRIORITIES["routine"])
+
+class PrioritySlots:
+    """Counting semaphore that hands out free slots by priority, then arrival order."""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int):
+        with self._cond:
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiters, ticket)
+            while self.active >= self.limit or self._waiters[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiters)
+            self.active += 1
+            # The next waiter in line may also fit
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+class ModelScheduler:
+    """Caps concurrency separately for each model (Whisper, LLaVA, Llama)."""
+    def __init__(self, limits=None):
+        self.limits = dict(limits or MODEL_LIMITS)
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def slots_for(self, model: str) -> PrioritySlots:
+        with self._lock:
+            if model not in self._slots:
+                self._slots[model] = PrioritySlots(self.limits.get(model, DEFAULT_LIMIT))
+            return self._slots[model]
+
+    @contextmanager
+    def slot(self, model: str, priority=None):
+        slots = self.slots_for(model)
+        slots.acquire(current_priority.get() if priority is None else priority)
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                model: {"limit": s.limit, "active": s.active, "waiting": s.waiting}
+                for model, s in self._slots.items()
+            }
+
+model_scheduler = ModelScheduler()
@@ -0,0 +1,145 @@
+import json
+from typing import List, Literal
+from pydantic import BaseModel
+
+# --- OUTPUT SCHEMAS (sent to Ollama as `format`, so generation is grammar constrained) ---
+
+class SoapNote(BaseModel):
+    subjective: str
+    objective: str
+    assessment: str
+    plan: str
+
+class LabRow(BaseModel):
+    test_name: str
+    value: str
+    unit: str
+    status: str
+    date: str
+
+class LabReport(BaseModel):
+    results: List[LabRow]
+
+class PassportAudit(BaseModel):
+    has_conflict: bool
+    severity: Literal["High", "Low"]
+    warnings: List[str]
+    recommendation: Literal["Merge Carefully", "Safe to Merge"]
+
+class DataEntry(BaseModel):
+    field: Literal["transcript", "soap_note", "history"]
+    text: str
+
+class PatientDraft(BaseModel):
+    name: str
+    age: int
+    history: str
+
+class PatientExtract(BaseModel):
+    name: str
+    age: int
+    medical_history: str
+
+class StructuredOutputError(ValueError):
+    """The model's JSON did not validate against the requested schema."""
+
+# --- INCREMENTAL PARSER ---
+
+class IncrementalJSONParser:
+    """
+    Scans a JSON object as it streams in and reports pieces as soon as they are complete:
+      ("field", (key, value))  a top-level field is finished (e.g. a SOAP section)
+      ("item", (key, value))   an element of a top-level array is finished (e.g. a lab row)
+    """
+    def __init__(self):
+        self.buf = ""
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.expect_key = True
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+        self.item_start = None
+
+    def _in_top_array(self):
+        return len(self.stack) == 2 and self.stack[0] == "{" and self.stack[1] == "["
+
+    def feed(self, text: str):
+        events = []
+        start = len(self.buf)
+        self.buf += text
+        for i in range(start, len(self.buf)):
+            c = self.buf[i]
+            depth = len(self.stack)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+                    if depth == 1 and self.expect_key and self.key_start is not None:
+                        self.key = json.loads(self.buf[self.key_start:i + 1])
+                        self.key_start = None
+                continue
+
+            if c == '"':
+                self.in_string = True
+                if depth == 1 and self.expect_key:
+                    self.key_start = i
+                elif depth == 1 and self.value_start is None:
+                    self.value_start = i
+                elif self._in_top_array() and self.item_start is None:
+                    self.item_start = i
+            elif c == ":" and depth == 1:
+                self.expect_key = False
+                self.value_start = None
+            elif c in "{[":
+                if depth == 1 and self.value_start is None:
+                    self.value_start = i
+                elif self._in_top_array() and self.item_start is None:
+                    self.item_start = i
+                self.stack.append(c)
+            elif c in "}]":
+                # Scalars end where their container ends
+                if self._in_top_array() and self.item_start is not None and self.buf[self.item_start] not in "{[":
+                    events.append(self._item(self.buf[self.item_start:i]))
+                if depth == 1 and self.value_start is not None and self.buf[self.value_start] not in "{[":
+                    events.append(self._field(self.buf[self.value_start:i]))
+                self.stack.pop()
+                # Containers end at their closing bracket
+                if self._in_top_array() and self.item_start is not None:
+                    events.append(self._item(self.buf[self.item_start:i + 1]))
+                if len(self.stack) == 1 and self.value_start is not None:
+                    events.append(self._field(self.buf[self.value_start:i + 1]))
+            elif c == ",":
+                if depth == 1:
+                    if self.value_start is not None:
+                        events.append(self._field(self.buf[self.value_start:i]))
+                    self.expect_key = True
+                elif self._in_top_array() and self.item_start is not None:
+                    events.append(self._item(self.buf[self.item_start:i]))
+            elif not c.isspace():
+                # Start of a number / true / false / null
+                if depth == 1 and not self.expect_key and self.value_start is None:
+                    self.value_start = i
+                elif self._in_top_array() and self.item_start is None:
+                    self.item_start = i
+        return [e for e in events if e is not None]
+
+    def _field(self, raw: str):
+        self.value_start = None
+        self.expect_key = True
+        try:
+            return "field", (self.key, json.loads(raw))
+        except ValueError:
+            return None
+
+    def _item(self, raw: str):
+        self.item_start = None
+        try:
+            return "item", (self.key, json.loads(raw))
+        except ValueError:
+            return None
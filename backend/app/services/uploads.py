@@ -0,0 +1,105 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from fastapi import HTTPException, UploadFile
+from pypdf import PdfReader
+
+# Configuration
+SCRATCH_ROOT = os.getenv("VITALIS_SCRATCH_DIR", "temp_uploads")
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024   # Kept in RAM below this, spilled to the request scratch dir above
+CHUNK_SIZE = 1024 * 1024
+
+MB = 1024 * 1024
+MAX_UPLOAD_BYTES = {
+    "audio": 200 * MB,
+    "image": 20 * MB,
+    "pdf": 50 * MB,
+    "passport": 50 * MB,
+}
+
+class BufferedUpload:
+    """An uploaded file held in memory (or a spooled temp file), with its size and content hash."""
+    def __init__(self, filename: str, content_type: str, file, size: int, sha256: str):
+        self.filename = os.path.basename(filename or "upload")
+        self.content_type = content_type
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+
+    def stream(self):
+        """File-like object rewound to the start (faster-whisper, pypdf...)."""
+        self.file.seek(0)
+        return self.file
+
+    def read_bytes(self) -> bytes:
+        return self.stream().read()
+
+    def save_to(self, path: str):
+        with open(path, "wb") as out:
+            shutil.copyfileobj(self.stream(), out, CHUNK_SIZE)
+        return path
+
+class UploadScratch:
+    """
+    Per-request upload handling: hashes and size-checks files in a single streaming pass
+    and removes any spilled bytes when the request is over.
+    """
+    def __init__(self):
+        self._dir = None
+        self._owned = []
+
+    @property
+    def dir(self):
+        if self._dir is None:
+            os.makedirs(SCRATCH_ROOT, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix="req_", dir=SCRATCH_ROOT)
+        return self._dir
+
+    async def read(self, upload: UploadFile, kind: str, own: bool = False) -> BufferedUpload:
+        """
+        Hashes + size-checks the upload. By default the buffer FastAPI already holds is reused
+        as-is (no copy). Pass own=True when the data must outlive the request (jobs, streams).
+        """
+        limit = MAX_UPLOAD_BYTES[kind]
+        hasher = hashlib.sha256()
+        size = 0
+        target = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY, dir=self.dir) if own else None
+
+        await upload.seek(0)
+        while chunk := await upload.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                if target: target.close()
+                raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds the {limit // MB} MB {kind} limit")
+            hasher.update(chunk)
+            if target: target.write(chunk)
+
+        if target:
+            self._owned.append(target)
+            target.seek(0)
+            return BufferedUpload(upload.filename, upload.content_type, target, size, hasher.hexdigest())
+
+        await upload.seek(0)
+        return BufferedUpload(upload.filename, upload.content_type, upload.file, size, hasher.hexdigest())
+
+    def close(self):
+        for f in self._owned:
+            f.close()
+        self._owned = []
+        if self._dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+async def upload_scratch():
+    """FastAPI dependency: one scratch space per request, always cleaned up."""
+    scratch = UploadScratch()
+    try:
+        yield scratch
+    finally:
+        scratch.close()
+
+def extract_pdf_text(source) -> str:
+    """Reads all page text straight from a path or file-like object (no temp copy)."""
+    reader = PdfReader(source)
+    return "\n".join([(page.extract_text() or "") for page in reader.pages])
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Configuration
+DTYPE = os.getenv("VITALIS_VECTOR_DTYPE", "float32")   # float32 | float16 (half the pages, ~1e-3 score error)
+MAX_SEGMENTS = 8          # Append-only segments before they are merged into one
+COMPACT_RATIO = 0.25      # Deleted rows (as a share of all rows) that trigger a rewrite
+ORPHAN_GRACE_SECONDS = 60 # A fresh segment may belong to a write another process hasn't committed yet
+BUSY_TIMEOUT_SECONDS = 60 # Writers wait this long for another process's compaction
+
+class NumpyVectorStore:
+    """
+    Exact-search vector store for a library of thousands of chunks: L2-normalized embeddings in
+    append-only .npy segments opened with mmap (uvicorn workers share the pages through the OS
+    page cache), ids/texts/metadata in a SQLite sidecar. Search is one matrix-vector product per
+    segment + argpartition. Deletes only drop sidecar rows; compaction rewrites the live rows.
+    Implements the part of the langchain Chroma API the knowledge service and ingest use.
+    """
+    def __init__(self, directory: str, embedding_function, dtype: str = DTYPE):
+        import numpy as np
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.embeddings = embedding_function
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "vectors.db"), timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                id TEXT PRIMARY KEY,
+                segment TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_vectors_segment ON vectors(segment, row);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+        self._version = None
+        self._segments = []   # [(name, mmap matrix, live row indices, ids of those rows)]
+
+    # --- READ SIDE ---
+    def _current_version(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else "0"
+
+    def _refresh(self):
+        """Re-opens the segments if any process changed the store since we last looked."""
+        with self._lock:
+            version = self._current_version()
+            if version == self._version:
+                return self._segments
+            try:
+                segments = self._open()
+            except FileNotFoundError:
+                # Another process compacted between our sidecar read and the file open
+                version = self._current_version()
+                segments = self._open()
+            self._segments, self._version = segments, version
+            return segments
+
+    def _open(self):
+        import numpy as np
+
+        rows = {}
+        for segment, row, chunk_id in self._conn.execute("SELECT segment, row, id FROM vectors ORDER BY segment, row"):
+            rows.setdefault(segment, ([], []))
+            rows[segment][0].append(row)
+            rows[segment][1].append(chunk_id)
+        segments = []
+        for name, (indices, ids) in rows.items():
+            matrix = np.load(self._path(name), mmap_mode="r")
+            segments.append((name, matrix, np.array(indices, dtype=np.int64), ids))
+        return segments
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        import numpy as np
+        from langchain_core.documents import Document
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        candidates = []   # (score, id)
+        for _, matrix, indices, ids in self._refresh():
+            scores = matrix[indices] @ query if len(indices) < len(matrix) else np.asarray(matrix @ query)
+            top = min(k, len(scores))
+            best = np.argpartition(-scores, top - 1)[:top] if top < len(scores) else np.arange(len(scores))
+            candidates.extend((float(scores[i]), ids[i]) for i in best)
+        candidates.sort(reverse=True)
+        chosen = [chunk_id for _, chunk_id in candidates[:k]]
+        records = self._records(chosen)
+        return [Document(page_content=records[i][0], metadata=records[i][1], id=i) for i in chosen if i in records]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k)
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        with self._lock:
+            if ids is None:
+                rows = self._conn.execute("SELECT id, text, metadata FROM vectors").fetchall()
+            else:
+                ids = list(ids)
+                marks = ",".join("?" * len(ids))
+                rows = self._conn.execute(f"SELECT id, text, metadata FROM vectors WHERE id IN ({marks})", ids).fetchall() if ids else []
+        result = {"ids": [r[0] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [r[1] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(r[2]) for r in rows]
+        return result
+
+    def _records(self, ids):
+        if not ids:
+            return {}
+        with self._lock:
+            marks = ",".join("?" * len(ids))
+            rows = self._conn.execute(f"SELECT id, text, metadata FROM vectors WHERE id IN ({marks})", list(ids)).fetchall()
+        return {r[0]: (r[1], json.loads(r[2])) for r in rows}
+
+    # --- WRITE SIDE ---
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        import numpy as np
+
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        name = self._write_segment(vectors.astype(self.dtype))
+        with self._lock:
+            self._conn.executemany("DELETE FROM vectors WHERE id = ?", [(i,) for i in ids])  # Upsert: old row becomes garbage
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (id, segment, row, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                [(i, name, row, text, json.dumps(meta or {})) for row, (i, text, meta) in enumerate(zip(ids, texts, metadatas))],
+            )
+            self._bump()
+            self._maybe_compact()
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM vectors WHERE id = ?", [(i,) for i in ids])
+            self._bump()
+            self._maybe_compact()
+
+    def _write_segment(self, matrix) -> str:
+        import numpy as np
+
+        name = f"seg-{uuid.uuid4().hex[:12]}"
+        tmp = self._path(name) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp, self._path(name))
+        return name
+
+    def _bump(self):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (uuid.uuid4().hex,))
+        self._conn.commit()
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Holds the SQLite write lock (BEGIN IMMEDIATE) with a fresh view of the live rows: no
+        other process can upsert or delete until we commit. The thread lock only covers this one.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._refresh()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _maybe_compact(self):
+        segments = self._refresh()
+        total = sum(len(matrix) for _, matrix, _, _ in segments)
+        live = sum(len(indices) for _, _, indices, _ in segments)
+        if len(segments) > MAX_SEGMENTS or (total and (total - live) / total > COMPACT_RATIO):
+            self.compact()
+        else:
+            with self._exclusive():
+                self._remove_orphans()
+
+    def compact(self):
+        """Rewrites all live rows into a single segment and drops the old files."""
+        import numpy as np
+
+        with self._exclusive() as segments:
+            if not segments:
+                return
+            matrix = np.concatenate([np.asarray(m[indices]) for _, m, indices, _ in segments]).astype(self.dtype)
+            ids = [i for *_, segment_ids in segments for i in segment_ids]
+            name = self._write_segment(matrix)
+            self._conn.executemany(
+                "UPDATE vectors SET segment = ?, row = ? WHERE id = ?",
+                [(name, row, chunk_id) for row, chunk_id in enumerate(ids)],
+            )
+            self._bump()
+            self._refresh()
+            self._remove_orphans()
+            print(f"🗜️ Vector store compacted: {len(segments)} segments -> 1 ({len(ids)} vectors).")
+
+    def _remove_orphans(self):
+        # Segments no row points to any more; readers that still map them keep their pages (POSIX)
+        live = {name for name, *_ in self._segments}
+        for file in os.listdir(self.directory):
+            if file.startswith("seg-") and file.endswith(".npy") and file[:-4] not in live:
+                path = os.path.join(self.directory, file)
+                try:
+                    if time.time() - os.path.getmtime(path) > ORPHAN_GRACE_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name + ".npy")
+
+    def stats(self):
+        segments = self._refresh()
+        return {
+            "segments": len(segments),
+            "vectors": sum(len(indices) for _, _, indices, _ in segments),
+            "rows": sum(len(matrix) for _, matrix, _, _ in segments),
+            "dtype": str(self.dtype),
+        }
@@ -1,10 +1,11 @@
-import ollama
+from app.services.llm import llm_gateway
 
 class VisionService:
     def __init__(self, model="llava"):
         self.model = model
 
-    def analyze_image(self, image_path):
+    def analyze_image(self, image):
+        # `image` can be a path or the raw bytes of the upload (Ollama accepts both)
         print("👁️ Vision Agent is analyzing the image...")
         
         prompt = """
@@ -16,12 +17,12 @@ class VisionService:
         """
 
         try:
-            response = ollama.chat(
+            response = llm_gateway.chat(
                 model=self.model,
                 messages=[{
                     'role': 'user',
                     'content': prompt,
-                    'images': [image_path]
+                    'images': [image]
                 }]
             )
             return response['message']['content']
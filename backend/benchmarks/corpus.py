@@ -0,0 +1,69 @@
+import os
+import random
+
+# Synthetic protocol PDFs: clinical filler plus one labelled "needle" per page, so every
+# generated query has exactly one relevant (document, page).
+
+FILLER = [
+    "Reassess the patient after every intervention and document the response.",
+    "Escalate to the senior clinician if the early warning score rises.",
+    "Check allergies and current medication before prescribing.",
+    "Sepsis should be considered in any patient with fever and a new organ dysfunction.",
+    "Headache with neck stiffness or a rash needs urgent review.",
+    "Record heart rate, blood pressure, respiratory rate, temperature and oxygen saturation.",
+    "Renal function guides dose adjustment for most renally cleared drugs.",
+    "Obtain informed consent and explain the plan in plain language.",
+    "Consider venous thromboembolism prophylaxis on admission.",
+    "Fluids are titrated to perfusion markers such as urine output and lactate.",
+    "Paediatric doses are weight based and must be double checked.",
+    "Review the microbiology results at 48 hours and rationalise antibiotics.",
+    "Pain should be scored and treated with the analgesic ladder.",
+    "Hand hygiene and aseptic technique reduce line infections.",
+    "Discharge planning starts on the day of admission.",
+]
+
+CONDITIONS = [
+    "community acquired pneumonia", "acute pyelonephritis", "cluster headache", "migraine with aura",
+    "diabetic ketoacidosis", "acute asthma", "cellulitis", "bacterial meningitis", "atrial fibrillation",
+    "acute gout", "hyperkalaemia", "anaphylaxis", "status epilepticus", "pulmonary embolism",
+    "upper gastrointestinal bleeding", "acute pancreatitis", "hypoglycaemia", "septic arthritis",
+]
+POPULATIONS = ["adults", "the elderly", "pregnancy", "children", "renal impairment", "liver disease"]
+SYLLABLES = ["zor", "va", "tide", "mex", "lo", "prin", "ca", "dex", "ril", "fen", "ta", "zol", "quin", "bu"]
+
+def drug_name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+
+def build(directory: str, documents: int = 20, pages: int = 5, seed: int = 7):
+    """Writes the PDFs. Returns (paths, labelled queries)."""
+    from fpdf import FPDF
+
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths, queries, used = [], [], set()
+    for d in range(documents):
+        name = f"synthetic_protocol_{d:03d}.pdf"
+        pdf = FPDF()
+        pdf.set_font("Arial", size=11)
+        for page in range(pages):
+            drug = drug_name(rng)
+            while drug in used:
+                drug = drug_name(rng)
+            used.add(drug)
+            condition, population = rng.choice(CONDITIONS), rng.choice(POPULATIONS)
+            dose, hours = rng.choice([5, 10, 25, 50, 100, 250, 500]), rng.choice([4, 6, 8, 12, 24])
+            needle = (
+                f"Protocol {d}.{page}: in {condition} in {population}, give {dose} mg of {drug} "
+                f"every {hours} hours and review after three doses."
+            )
+            filler = [rng.choice(FILLER) for _ in range(rng.randint(18, 30))]
+            filler.insert(rng.randrange(len(filler)), needle)
+            pdf.add_page()
+            pdf.multi_cell(0, 6, " ".join(filler))
+            relevant = [{"source": name, "page": page}]
+            queries.append({"query": f"What is the dose of {drug}?", "relevant": relevant, "kind": "exact"})
+            queries.append({"query": f"How often is {drug} given for {condition}?", "relevant": relevant, "kind": "mixed"})
+        path = os.path.join(directory, name)
+        pdf.output(path, "F")
+        paths.append(path)
+    return paths, queries
@@ -0,0 +1,201 @@
+"""
+RAG benchmark: ingest throughput, retrieval quality and query latency of KnowledgeService.
+
+    cd backend && python -m benchmarks.rag --synthetic 20 --pages 5 --modes hybrid vector lexical
+    python -m benchmarks.rag --baseline benchmarks/results/rag-20260101-120000.json
+
+Runs offline (no Ollama): only the embedding model is needed (set HF_HUB_OFFLINE=1 once it is
+cached). Everything is indexed into a scratch directory; the real knowledge_db is not touched.
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]  # Nearest rank
+
+def latency(values):
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+    }
+
+def score(queries, ks):
+    """recall@k and MRR over [{"ranks": [...relevant hit ranks], "relevant": n}]."""
+    out = {f"recall@{k}": round(sum(len([r for r in q["ranks"] if r <= k]) / q["relevant"] for q in queries) / len(queries), 4) for k in ks}
+    out["mrr"] = round(sum(1 / min(q["ranks"]) if q["ranks"] else 0 for q in queries) / len(queries), 4)
+    return out
+
+def run_queries(service, queries, mode: str, ks, warm: bool):
+    results = []
+    for item in queries:
+        if not warm:
+            service.embedding_cache.clear()
+            service.retrieval_cache.clear()
+        started = time.perf_counter()
+        hits = service.retrieve(item["query"], k=max(ks), mode=mode)
+        ms = (time.perf_counter() - started) * 1000
+        relevant = {(r["source"], r["page"]) for r in item["relevant"]}
+        ranks = [i + 1 for i, (_, meta) in enumerate(hits) if (os.path.basename(meta.get("source", "")), meta.get("page")) in relevant]
+        results.append({"query": item["query"], "kind": item["kind"], "ranks": ranks, "relevant": len(relevant), "ms": round(ms, 2)})
+    return results
+
+def summarize(results, ks):
+    kinds = sorted({r["kind"] for r in results})
+    return {
+        "overall": {**score(results, ks), "latency_ms": latency([r["ms"] for r in results])},
+        "by_kind": {kind: score([r for r in results if r["kind"] == kind], ks) for kind in kinds},
+        "misses": [r["query"] for r in results if not r["ranks"]],
+    }
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(current, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    now = flatten({"ingest": current["ingest"], "retrieval": current["retrieval"]})
+    before = flatten({"ingest": baseline["ingest"], "retrieval": baseline["retrieval"]})
+    print(f"\n📊 vs {os.path.basename(baseline_path)} ({baseline['config'].get('commit')}):")
+    for key in sorted(now.keys() & before.keys()):
+        if now[key] != before[key]:
+            delta = now[key] - before[key]
+            pct = f" ({delta / before[key] * 100:+.1f}%)" if before[key] else ""
+            print(f"   {key}: {before[key]} -> {now[key]}{pct}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Vitalis RAG benchmark")
+    parser.add_argument("--library", default=os.path.join(BACKEND, "library"), help="Real PDFs to include")
+    parser.add_argument("--queries", default=os.path.join(HERE, "queries.json"), help="Labelled queries for the library PDFs")
+    parser.add_argument("--synthetic", type=int, default=20, help="Synthetic documents to generate")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per synthetic document")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--modes", nargs="+", default=["hybrid", "vector", "lexical"])
+    parser.add_argument("--store", choices=["chroma", "numpy"], help="VITALIS_VECTOR_STORE")
+    parser.add_argument("--embeddings", choices=["onnx", "torch"], help="VITALIS_EMBEDDINGS")
+    parser.add_argument("--warm", action="store_true", help="Keep the query caches between queries")
+    parser.add_argument("--workdir", help="Scratch directory (default: a temp dir, removed afterwards)")
+    parser.add_argument("--out", help="Result JSON (default: benchmarks/results/rag-<time>.json)")
+    parser.add_argument("--baseline", help="Earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    if args.store:
+        os.environ["VITALIS_VECTOR_STORE"] = args.store
+    if args.embeddings:
+        os.environ["VITALIS_EMBEDDINGS"] = args.embeddings
+    library = os.path.abspath(args.library)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    out = os.path.abspath(args.out or os.path.join(HERE, "results", f"rag-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="vitalis-rag-"))
+    os.makedirs(workdir, exist_ok=True)
+
+    with open(args.queries) as f:
+        queries = json.load(f)
+    pdfs = sorted(os.path.join(library, f) for f in os.listdir(library) if f.endswith(".pdf")) if os.path.isdir(library) else []
+
+    sys.path.insert(0, BACKEND)
+    from benchmarks import corpus
+    synthetic, synthetic_queries = corpus.build(os.path.join(workdir, "synthetic"), args.synthetic, args.pages, args.seed)
+    queries += synthetic_queries
+
+    # The knowledge service keeps its stores under ./knowledge_db: build them in the scratch dir
+    os.chdir(workdir)
+    from app.services.ingest import CHUNK_SIZE, CHUNK_OVERLAP
+    from app.services.knowledge import knowledge_service as service
+
+    try:
+        started = time.perf_counter()
+        service.embed_query("warm up")
+        load_seconds = time.perf_counter() - started
+
+        paths = pdfs + synthetic
+        result = service.ingest_pdfs(paths)
+        started = time.perf_counter()
+        service.ingest_pdfs(paths)   # Nothing changed: the catalog should skip everything
+        reingest_seconds = time.perf_counter() - started
+        seconds = max(result["seconds"], 1e-9)
+        ingest = {
+            "documents": len(paths),
+            "pages": result["pages"],
+            "chunks": result["chunks_indexed"],
+            "seconds": result["seconds"],
+            "pages_per_second": round(result["pages"] / seconds, 2),
+            "chunks_per_second": round(result["chunks_indexed"] / seconds, 2),
+            "store_load_seconds": round(load_seconds, 2),
+            "reingest_seconds": round(reingest_seconds, 3),
+        }
+        print(f"📥 Ingest: {ingest['pages']} pages, {ingest['chunks']} chunks in {ingest['seconds']}s "
+              f"({ingest['pages_per_second']} pages/s, {ingest['chunks_per_second']} chunks/s)")
+
+        retrieval = {}
+        for mode in args.modes:
+            routes_before = dict(service.routes)
+            results = run_queries(service, queries, mode, args.k, args.warm)
+            retrieval[mode] = summarize(results, args.k)
+            retrieval[mode]["routes"] = {k: v - routes_before.get(k, 0) for k, v in service.routes.items() if v != routes_before.get(k, 0)}
+            overall = retrieval[mode]["overall"]
+            print(f"🔎 {mode}: " + ", ".join(f"{k} {v}" for k, v in overall.items() if k != "latency_ms")
+                  + f" | latency ms {overall['latency_ms']}")
+
+        stats = service.stats()
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "config": {
+                "commit": git_commit(),
+                "chunk_size": CHUNK_SIZE,
+                "chunk_overlap": CHUNK_OVERLAP,
+                "vector_store": stats.get("vector_store"),
+                "embeddings": stats.get("embeddings"),
+                "k": args.k,
+                "warm": args.warm,
+                "synthetic_documents": args.synthetic,
+                "synthetic_pages": args.pages,
+                "queries": len(queries),
+                "env": {k: v for k, v in os.environ.items() if k.startswith("VITALIS_")},
+            },
+            "ingest": ingest,
+            "retrieval": retrieval,
+        }
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved {out}")
+        if baseline:
+            compare(report, baseline)
+    finally:
+        service.shutdown()
+        os.chdir(BACKEND)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import pytest
+from app.services.pharmacology import PharmacologyEngine
+
+engine = PharmacologyEngine()
+
+@pytest.mark.parametrize("plan, history, status", [
+    # Allergy and interaction tables
+    ("Plan: amoxicillin 500 mg tid", "Allergic to penicillin", "WARNING"),
+    ("Plan: If no improvement start amoxicillin 500 mg tid", "Allergic to penicillin", "WARNING"),
+    ("Plan: ibuprofen 400 mg tid", "Allergic to penicillin, on warfarin for AF", "WARNING"),
+    ("Plan: ketorolac 30 mg IV", "Aspirin-sensitive asthma", "WARNING"),
+    ("Plan: ibuprofen 400 mg tid", "Sensitive to NSAIDs", "WARNING"),
+    # Unresolved allergies and unrecognized medications go to the model
+    ("Plan: Give metoclopramide IV for nausea.", "Allergic to metoclopramide.", "AMBIGUOUS"),
+    ("Plan: Start sumatriptan for the migraine.", "Allergic to sumatriptan.", "AMBIGUOUS"),
+    ("Plan: Commence norepinephrine infusion.", "Anaphylaxis to norepinephrine.", "AMBIGUOUS"),
+    ("Plan: amoxicillin 500 mg tid", "Has been allergic to cefaclor", "AMBIGUOUS"),
+    ("Plan: No amoxicillin 500 mg tid", "NKDA", "AMBIGUOUS"),
+    # Nothing to flag
+    ("Plan: Stop warfarin, start apixaban 5 mg bid", "NKDA", "SAFE"),
+    ("Plan: Do not give amoxicillin. Start azithromycin 500 mg", "Allergic to penicillin", "SAFE"),
+    ("Plan: rest and oral fluids", "Allergic to cats", "SAFE"),
+])
+def test_review(plan, history, status):
+    assert engine.review(plan, history).status == status
+
+def test_history_splits_allergies_from_current_meds():
+    allergens, current, unresolved = engine.history_profile("Allergic to penicillin, on warfarin for AF. NKDA, takes metformin")
+    assert allergens == [("drug", "penicillin")]
+    assert current == ["warfarin", "metformin"]
+    assert unresolved == []
+
+def test_non_drug_allergens_match_whole_words():
+    assert engine.history_profile("Has been allergic to a medication")[2] == ["Has been allergic to a medication"]
+    assert engine.history_profile("Allergic to bees")[2] == []
@@ -270,8 +270,14 @@ export default function VitalisApp() {
   
     const fetchPatients = async () => {
       try {
-        const res = await fetch("http://127.0.0.1:8000/patients/");
-        const data = await res.json();
+        // The registry is paged: follow X-Next-Cursor until the last page
+        let data: Patient[] = [];
+        let cursor: string | null = null;
+        do {
+          const res: Response = await fetch(`http://127.0.0.1:8000/patients/?limit=500${cursor ? `&cursor=${cursor}` : ""}`);
+          data = data.concat(await res.json());
+          cursor = res.headers.get("X-Next-Cursor");
+        } while (cursor);
         setPatients(data);
         if (data.length > 0 && !selectedPatientId) setSelectedPatientId(data[0].id);
       } catch (error) { console.error("Failed to fetch patients", error); }
@@ -575,6 +581,7 @@ function PatientRecordsView({ patients, addToast, externalSelectedId, setExterna
     // 1. Initialize State (Sync with external prop if available)
     const [selectedId, setSelectedId] = useState<number | null>(externalSelectedId || null);
     const [history, setHistory] = useState<any>(null);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
     const [loading, setLoading] = useState(false);
     const [searchTerm, setSearchTerm] = useState("");
     const [dateFilter, setDateFilter] = useState(""); 
@@ -593,12 +600,16 @@ function PatientRecordsView({ patients, addToast, externalSelectedId, setExterna
         if (setExternalSelectedId) setExternalSelectedId(id);
     };
 
-    const fetchHistory = () => {
+    // Newest records first, 20 at a time; "Load older records" fetches the next page
+    const fetchHistory = (cursor: string | null = null) => {
         if (!selectedId) return;
-        setLoading(true);
-        fetch(`http://127.0.0.1:8000/patients/${selectedId}/history`)
-            .then(res => res.json())
-            .then(data => { setHistory(data); setLoading(false); })
+        if (!cursor) setLoading(true);
+        fetch(`http://127.0.0.1:8000/patients/${selectedId}/history?notes=true&limit=20${cursor ? `&cursor=${cursor}` : ""}`)
+            .then(res => { setNextCursor(res.headers.get("X-Next-Cursor")); return res.json(); })
+            .then(data => {
+                setHistory((prev: any) => cursor && prev ? { ...data, consultations: [...prev.consultations, ...data.consultations] } : data);
+                setLoading(false);
+            })
             .catch(() => setLoading(false));
     };
 
@@ -691,6 +702,9 @@ function PatientRecordsView({ patients, addToast, externalSelectedId, setExterna
                                     </div>
                                 </div>
                             ))}
+                            {nextCursor && (
+                                <button onClick={() => fetchHistory(nextCursor)} className="text-xs text-slate-500 hover:text-emerald-400">Load older records</button>
+                            )}
                         </div>
                     </div>
                 ) : null}